@@ -0,0 +1,173 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from qdrant_client import QdrantClient
+
+from src.download import DownloadManifest, FixtureSubtitleSource, download_playlist
+from src.load import ENCODE_BATCH_SIZE, encode_batch, store_subtitle_data
+from src.processor import iter_subtitle_chunks, process_subtitle_file
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+WORDS = (
+    "the of and to in is that it was for on are as with his they at be this from have or by one had not but what "
+    "all were when we there can an your which their said if do will each about how up out them then she many some "
+    "so these would other into has more her two like him see time could no make than first been its who now people "
+    "my made over did down only way find use may water long little very after words called just where most know "
+    "philosophy podcast episode history language meaning mind freedom society nature truth reason love power"
+).split()
+
+
+def synthetic_chunks(videos: int, chunks_per_video: int, words_per_chunk: int, seed: int = 0):
+    # the shape process_subtitle_file returns, with 30-second windows of random words
+    rng = random.Random(seed)
+    chunks = {}
+    for video in range(videos):
+        file_name = f"Episode {video}"
+        chunks[file_name] = [
+            {
+                "file_name": file_name,
+                "start": index * 30,
+                "end": (index + 1) * 30,
+                "text": " ".join(rng.choices(WORDS, k=words_per_chunk)),
+                "video_id": f"video{video:05d}"
+            }
+            for index in range(chunks_per_video)
+        ]
+    return chunks
+
+
+def bench_encode(args):
+    from sentence_transformers import SentenceTransformer
+
+    encoder = SentenceTransformer(args.model, device="cpu")
+    chunks = synthetic_chunks(args.videos, args.chunks_per_video, args.words_per_chunk)
+    docs = [data["text"] for file_chunks in chunks.values() for data in file_chunks]
+    print(f"{len(docs)} chunks of {args.words_per_chunk} words from {args.videos} videos, {args.model} on CPU")
+
+    sample = docs[:args.per_chunk_sample]
+    start = time.perf_counter()
+    for doc in sample:
+        encoder.encode(doc)
+    print(f"{'one encode() per chunk':>28}: {len(sample) / (time.perf_counter() - start):>8.1f} chunks/sec "
+          f"({len(sample)} chunks)")
+
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        for index in range(0, len(docs), batch_size):
+            encode_batch(encoder, docs[index:index + batch_size], batch_size)
+        print(f"{f'encode, batch {batch_size}':>28}: {len(docs) / (time.perf_counter() - start):>8.1f} chunks/sec")
+
+    client = QdrantClient(location=args.qdrant_url)
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        loaded = store_subtitle_data(chunks, "benchmark", client, encoder, batch_size)
+        chunks_per_second = loaded / (time.perf_counter() - start)
+        print(f"{f'encode + upload, batch {batch_size}':>28}: {chunks_per_second:>8.1f} chunks/sec")
+    client.delete_collection("benchmark")
+
+
+def vtt_timestamp(seconds: float):
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def write_synthetic_vtt(input_path: str, videos: int, captions_per_video: int, seed: int = 0):
+    # files named like yt-dlp's "<title> [<video id>].en.vtt", one 2-second caption after another
+    rng = random.Random(seed)
+    for video in range(videos):
+        lines = ["WEBVTT", ""]
+        for index in range(captions_per_video):
+            lines += [
+                f"{vtt_timestamp(index * 2)} --> {vtt_timestamp(index * 2 + 2)}",
+                " ".join(rng.choices(WORDS, k=8)),
+                " ".join(rng.choices(WORDS, k=8)),
+                ""
+            ]
+        with open(os.path.join(input_path, f"Episode {video} [video{video:05d}].en.vtt"), "w") as file:
+            file.write("\n".join(lines))
+
+
+def bench_parse(args):
+    input_path = tempfile.mkdtemp()
+    try:
+        write_synthetic_vtt(input_path, args.videos, args.captions_per_video)
+        print(f"{args.videos} VTT files of {args.captions_per_video} captions, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'all files (s)':>14} {'first file (s)':>15}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            first = None
+            for _ in iter_subtitle_chunks(input_path, args.segment_seconds, workers=workers):
+                first = first if first is not None else time.perf_counter() - start
+            print(f"{workers:>7} {time.perf_counter() - start:>14.3f} {first:>15.3f}")
+
+        chunks = process_subtitle_file(input_path, args.segment_seconds, workers=1)
+        print(f"{sum(len(file_chunks) for file_chunks in chunks.values())} chunks of {args.segment_seconds} seconds")
+    finally:
+        shutil.rmtree(input_path, ignore_errors=True)
+
+
+def bench_download(args):
+    fixture_path, input_path = tempfile.mkdtemp(), tempfile.mkdtemp()
+    manifest_path = os.path.join(input_path, "downloads.json")
+    try:
+        write_synthetic_vtt(fixture_path, args.videos, 10)
+        source = FixtureSubtitleSource(fixture_path, args.latency_ms / 1000)
+        print(f"{args.videos} videos from a local fake with {args.latency_ms:g} ms per video")
+        print(f"{'workers':>7} {'seconds':>8} {'videos/sec':>11}")
+        for workers in args.workers:
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            start = time.perf_counter()
+            downloaded = download_playlist("fixtures", os.path.join(input_path, "subtitles"),
+                                           DownloadManifest.load(manifest_path, "fixtures"), source, workers)
+            seconds = time.perf_counter() - start
+            print(f"{workers:>7} {seconds:>8.2f} {len(downloaded) / seconds:>11.1f}")
+
+        # an interrupted load: half of the videos are already marked done in the manifest
+        video_ids = source.video_ids("fixtures")
+        done = dict.fromkeys(video_ids[:args.videos // 2], "done")
+        DownloadManifest(manifest_path, "fixtures", video_ids, done).save()
+        start = time.perf_counter()
+        download_playlist("fixtures", os.path.join(input_path, "subtitles"),
+                          DownloadManifest.load(manifest_path, "fixtures"), source, args.workers[-1])
+        print(f"resuming after {args.videos // 2} videos with {args.workers[-1]} workers: "
+              f"{time.perf_counter() - start:.2f} s")
+    finally:
+        shutil.rmtree(fixture_path, ignore_errors=True)
+        shutil.rmtree(input_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the subtitle load pipeline.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    encode_parser = subparsers.add_parser("encode", help="Chunks/sec of per-chunk vs batched encoding and loading")
+    encode_parser.add_argument('--model', type=str, default=MODEL_NAME)
+    encode_parser.add_argument('--qdrant-url', type=str, default=":memory:", help="Qdrant URL, or :memory:")
+    encode_parser.add_argument('--videos', type=int, default=100, help="Playlist size")
+    encode_parser.add_argument('--chunks-per-video', type=int, default=60, help="30-second windows per video")
+    encode_parser.add_argument('--words-per-chunk', type=int, default=80)
+    encode_parser.add_argument('--per-chunk-sample', type=int, default=500, help="Chunks timed one encode() at a time")
+    encode_parser.add_argument('--batch-sizes', type=int, nargs="+", default=[16, ENCODE_BATCH_SIZE, 256])
+    encode_parser.set_defaults(run=bench_encode)
+
+    parse_parser = subparsers.add_parser("parse", help="Serial vs process pool parsing of synthetic VTT files")
+    parse_parser.add_argument('--videos', type=int, default=200, help="VTT files to parse")
+    parse_parser.add_argument('--captions-per-video', type=int, default=1500, help="2-second captions per file")
+    parse_parser.add_argument('--segment-seconds', type=int, default=30)
+    parse_parser.add_argument('--workers', type=int, nargs="+", default=[1, 2, 4])
+    parse_parser.set_defaults(run=bench_parse)
+
+    download_parser = subparsers.add_parser("download", help="Concurrent and resumed downloads from a local fake")
+    download_parser.add_argument('--videos', type=int, default=100, help="Playlist size")
+    download_parser.add_argument('--latency-ms', type=float, default=200, help="Simulated round trip per video")
+    download_parser.add_argument('--workers', type=int, nargs="+", default=[1, 4, 8, 16])
+    download_parser.set_defaults(run=bench_download)
+
+    args = parser.parse_args()
+    args.run(args)
@@ -1,12 +1,15 @@
 import argparse
 import shutil
 
-from src.load import store_subtitle_data
-from src.processor import process_subtitle_file
+from src.cache import CACHE_PATH, EmbeddingCache
+from src.download import (
+    DOWNLOAD_WORKERS, DownloadManifest, YoutubeSubtitleSource, download_playlist, download_videos
+)
+from src.load import ENCODE_BATCH_SIZE, indexed_video_ids, store_subtitle_data, sync_subtitle_data
+from src.processor import get_youtube_id, iter_subtitle_chunks
 from src.search import initiate_rag_search
 from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
-import yt_dlp
 import os
 
 if __name__ == "__main__":
@@ -17,6 +20,13 @@ if __name__ == "__main__":
     parser.add_argument('--name', type=str, help='The name of the store to work on', required=True)
     parser.add_argument('--load', type=str, help='Youtube video or playlist url')
     parser.add_argument('--search', type=str, help='The query you need me to search for')
+    parser.add_argument('--sync', action='store_true',
+                        help='Only add new videos of the --load playlist and delete removed ones')
+    parser.add_argument('--cache-path', type=str, default=CACHE_PATH, help='SQLite embedding cache, "" disables it')
+    parser.add_argument('--download-workers', type=int, default=DOWNLOAD_WORKERS,
+                        help='Videos whose subtitles are downloaded at the same time')
+    parser.add_argument('--workers', type=int, default=None, help='Processes parsing subtitle files')
+    parser.add_argument('--batch-size', type=int, default=ENCODE_BATCH_SIZE, help='Chunks encoded per batch')
 
     # parse args
     args = parser.parse_args()
@@ -24,9 +34,10 @@ if __name__ == "__main__":
     load_url = args.load
     collection_name = args.name
     segment_point_in_second = 30  # segments subtitles per 30-second window frame
+    model_name = "all-MiniLM-L6-v2"
 
     # qdrant options
-    encoder = SentenceTransformer("all-MiniLM-L6-v2")
+    encoder = SentenceTransformer(model_name)
     qdrant_client = QdrantClient(url="http://localhost:6333")
 
     if not load_url and not search_query:
@@ -63,39 +74,66 @@ if __name__ == "__main__":
         print(f"Downloading subtitle for: {load_url} URL for collection: '{collection_name}'")
 
         input_path = f"collections/{collection_name}/subtitles"  # where to store the downloaded subtitles
+        manifest_path = f"collections/{collection_name}/downloads.json"  # downloaded videos of the latest load
+        source = YoutubeSubtitleSource()
+        cache = EmbeddingCache(model_name, args.cache_path) if args.cache_path else None
 
-        if os.path.isdir(input_path):
-            print("Deleting existing directory")
-            shutil.rmtree(input_path)
-
-        ydl_opts = {
-            'skip_download': True,
-            'subtitlesformat': 'vtt',
-            'subtitleslangs': ['en'],
-            'writeautomaticsub': True,
-            'writesubtitles': True,
-            "ignoreerrors": True, #skip private videos
-            "paths": {
-                "home": input_path
-            }
-        }
         try:
-            # Create a YoutubeDL instance and extract information
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Download/extract subtitles
-                error_code = ydl.download([load_url])
-                print(f"yt_dlp error code {error_code}")
-
-            print(f"Downloading subtitle done, starting chunk process")
-            chunks = process_subtitle_file(input_path, segment_point_in_second)
-
-            print(f"Finished creating chunks for: {len(chunks)} files, next storing to db")
-            store_subtitle_data(
-                chunks=chunks,
-                collection_name=collection_name,
-                client=qdrant_client,
-                encoder=encoder
-            )
-            print("Finished storing.")
+            if args.sync:
+                manifest = DownloadManifest.load(manifest_path, load_url)
+                playlist_ids = source.video_ids(load_url)
+                indexed_ids = indexed_video_ids(qdrant_client, collection_name)
+                # videos known to have no subtitles have no points either, they are not new
+                skipped_ids = manifest.without_subtitles()
+                new_ids = [
+                    video_id for video_id in playlist_ids if video_id not in indexed_ids and video_id not in skipped_ids
+                ]
+                removed_ids = indexed_ids - set(playlist_ids)
+                print(f"{len(playlist_ids)} videos in the playlist: {len(new_ids)} new, {len(removed_ids)} removed")
+
+                if os.path.isdir(input_path):
+                    for file_name in os.listdir(input_path):
+                        if get_youtube_id(file_name) in removed_ids:
+                            os.remove(os.path.join(input_path, file_name))
+
+                chunks = {}
+                if new_ids:
+                    downloaded = download_videos(new_ids, input_path, manifest, source, args.download_workers)
+                    chunks = iter_subtitle_chunks(input_path, segment_point_in_second, set(downloaded), args.workers)
+
+                print(f"Parsing subtitles of the new videos and syncing the db")
+                loaded = sync_subtitle_data(
+                    chunks=chunks,
+                    removed_video_ids=removed_ids,
+                    collection_name=collection_name,
+                    client=qdrant_client,
+                    encoder=encoder,
+                    batch_size=args.batch_size,
+                    cache=cache
+                )
+            else:
+                manifest = DownloadManifest.load(manifest_path, load_url)
+                if manifest.done():
+                    print(f"Resuming the interrupted download, {len(manifest.done())} videos already downloaded")
+                elif os.path.isdir(input_path):
+                    print("Deleting existing directory")
+                    shutil.rmtree(input_path)
+
+                downloaded = download_playlist(load_url, input_path, manifest, source, args.download_workers)
+                print(f"Downloaded subtitles of {len(downloaded)} videos")
+
+                print(f"Downloading subtitle done, parsing chunks and storing them to db as files are parsed")
+                chunks = iter_subtitle_chunks(input_path, segment_point_in_second, workers=args.workers)
+                loaded = store_subtitle_data(
+                    chunks=chunks,
+                    collection_name=collection_name,
+                    client=qdrant_client,
+                    encoder=encoder,
+                    batch_size=args.batch_size,
+                    cache=cache
+                )
+            # only a stored load is complete, an interrupted one resumes from its downloaded subtitles
+            manifest.finish()
+            print(f"Finished storing {loaded} chunks.")
         except Exception as e:
             print(f"An error occurred: {str(e)}")
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+
+CACHE_PATH = "collections/embedding_cache.sqlite"  # shared by every collection
+LOOKUP_SIZE = 500  # hashes per query, below SQLite's limit on bound parameters
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    # float32 embeddings on disk, keyed by (model name, sha256 of the chunk text)
+
+    def __init__(self, model_name: str, path: str = CACHE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.model_name = model_name
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash BLOB NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    def get_many(self, texts):
+        # cached vectors by position in texts, missing texts are left out
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        for index in range(0, len(hashes), LOOKUP_SIZE):
+            lookup = hashes[index:index + LOOKUP_SIZE]
+            rows = self.connection.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                f"AND text_hash IN ({', '.join('?' * len(lookup))})",
+                [self.model_name, *lookup]
+            )
+            found.update((bytes(key), np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+
+        vectors = {position: found[key] for position, key in enumerate(hashes) if key in found}
+        self.hits += len(vectors)
+        self.misses += len(texts) - len(vectors)
+        return vectors
+
+    def put_many(self, texts, vectors: np.ndarray):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+            [
+                (self.model_name, text_hash(text), np.asarray(vector, dtype=np.float32).tobytes())
+                for text, vector in zip(texts, vectors)
+            ]
+        )
+        self.connection.commit()
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def close(self):
+        self.connection.close()
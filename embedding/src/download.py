@@ -0,0 +1,177 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import shutil
+import threading
+import time
+
+import yt_dlp
+
+from .processor import get_youtube_id
+
+DOWNLOAD_WORKERS = 8
+
+
+def subtitle_options(input_path: str):
+    return {
+        'skip_download': True,
+        'subtitlesformat': 'vtt',
+        'subtitleslangs': ['en'],
+        'writeautomaticsub': True,
+        'writesubtitles': True,
+        "ignoreerrors": True,  # skip private videos
+        "quiet": True,
+        "paths": {
+            "home": input_path
+        }
+    }
+
+
+def video_url(video_id: str):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+class SubtitleSource(ABC):
+    # the network layer of the downloader: lists the videos of a url and fetches the subtitles of one video
+
+    @abstractmethod
+    def video_ids(self, url: str):
+        ...
+
+    @abstractmethod
+    def fetch(self, video_id: str, input_path: str) -> bool:
+        # False when the video could not be fetched, True also when it has no subtitles to write
+        ...
+
+
+class YoutubeSubtitleSource(SubtitleSource):
+
+    def video_ids(self, url: str):
+        # lists the entries without visiting each video page
+        options = {"extract_flat": "in_playlist", "ignoreerrors": True, "quiet": True}
+        with yt_dlp.YoutubeDL(options) as ydl:
+            info = ydl.extract_info(url, download=False)
+
+        if info is None:
+            return []
+        if info.get("_type") == "playlist":
+            return [entry["id"] for entry in info.get("entries") or [] if entry]
+        return [info["id"]]
+
+    def fetch(self, video_id: str, input_path: str) -> bool:
+        # one YoutubeDL per call, instances are not shared between threads
+        with yt_dlp.YoutubeDL(subtitle_options(input_path)) as ydl:
+            return ydl.download([video_url(video_id)]) == 0
+
+
+class FixtureSubtitleSource(SubtitleSource):
+    # serves the VTT files of a local directory, named like yt-dlp's "<title> [<video id>].en.vtt"
+
+    def __init__(self, fixture_path: str, delay_seconds: float = 0.0):
+        self.fixture_path = fixture_path
+        self.delay_seconds = delay_seconds  # simulated round trip per video
+
+    def video_ids(self, url: str):
+        return sorted({get_youtube_id(file_name) for file_name in os.listdir(self.fixture_path)})
+
+    def fetch(self, video_id: str, input_path: str) -> bool:
+        time.sleep(self.delay_seconds)
+        file_names = [file_name for file_name in os.listdir(self.fixture_path) if get_youtube_id(file_name) == video_id]
+        for file_name in file_names:
+            shutil.copy(os.path.join(self.fixture_path, file_name), os.path.join(input_path, file_name))
+        return len(file_names) > 0
+
+
+def has_subtitles(input_path: str, video_id: str) -> bool:
+    return any(get_youtube_id(file_name) == video_id for file_name in os.listdir(input_path))
+
+
+class DownloadManifest:
+    # the videos of a load and which of them are downloaded, saved after every video so a load can resume
+
+    def __init__(self, path: str, url: str, video_ids=None, videos=None):
+        self.path = path
+        self.url = url
+        self.video_ids = video_ids  # the playlist entries, resolved once per load
+        self.videos = videos or {}  # video id -> "done", "failed" or "no_subtitles"
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, url: str):
+        # the unfinished load of url saved at path, or a new manifest
+        if os.path.exists(path):
+            with open(path) as file:
+                state = json.load(file)
+            if state["url"] == url and not state["complete"]:
+                return cls(path, url, state["video_ids"], state["videos"])
+            if state["url"] == url:
+                # videos without subtitles are not fetched again by later loads of the same url
+                return cls(path, url, videos={
+                    video_id: status for video_id, status in state["videos"].items() if status == "no_subtitles"
+                })
+        return cls(path, url)
+
+    def done(self):
+        return [video_id for video_id, status in self.videos.items() if status == "done"]
+
+    def without_subtitles(self):
+        return {video_id for video_id, status in self.videos.items() if status == "no_subtitles"}
+
+    def mark(self, video_id: str, status: str):
+        with self.lock:
+            self.videos[video_id] = status
+            self.save()
+
+    def finish(self):
+        with self.lock:
+            self.save(complete=True)
+
+    def save(self, complete: bool = False):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        state = {"url": self.url, "complete": complete, "video_ids": self.video_ids, "videos": self.videos}
+        with open(self.path + ".tmp", "w") as file:
+            json.dump(state, file)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def download_videos(video_ids, input_path: str, manifest: DownloadManifest, source: SubtitleSource,
+                    workers: int = DOWNLOAD_WORKERS):
+    # fetches the videos not yet done in the manifest on a bounded pool, returns the downloaded ones
+    os.makedirs(input_path, exist_ok=True)
+    pending = [video_id for video_id in video_ids if manifest.videos.get(video_id) not in ("done", "no_subtitles")]
+
+    def fetch(video_id: str):
+        try:
+            fetched = source.fetch(video_id, input_path)
+        except Exception as e:
+            print(f"Downloading {video_id} failed: {str(e)}")
+            fetched = False
+        if not fetched:
+            manifest.mark(video_id, "failed")
+        elif has_subtitles(input_path, video_id):
+            manifest.mark(video_id, "done")
+        else:
+            manifest.mark(video_id, "no_subtitles")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fetch, pending))
+
+    failed = [video_id for video_id in video_ids if manifest.videos.get(video_id) == "failed"]
+    if failed:
+        print(f"Downloading subtitles failed for {len(failed)} videos")
+    missing = [video_id for video_id in video_ids if manifest.videos.get(video_id) == "no_subtitles"]
+    if missing:
+        print(f"{len(missing)} videos have no subtitles")
+    return [video_id for video_id in video_ids if manifest.videos.get(video_id) == "done"]
+
+
+def download_playlist(url: str, input_path: str, manifest: DownloadManifest, source: SubtitleSource,
+                      workers: int = DOWNLOAD_WORKERS):
+    if manifest.video_ids is None:
+        manifest.video_ids = source.video_ids(url)
+        manifest.save()
+
+    # the caller finishes the manifest once the subtitles are stored
+    return download_videos(manifest.video_ids, input_path, manifest, source, workers)
@@ -1,15 +1,28 @@
-from collections import defaultdict
-import os
-from qdrant_client import models
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 import uuid
 
+import numpy as np
+from qdrant_client import models
+
+ENCODE_BATCH_SIZE = 64  # chunks encoded, then uploaded, together
+SCROLL_SIZE = 1000
+POINT_NAMESPACE = uuid.UUID("5f0b7c1e-3d4a-4a8e-9d8f-2c6b1e7a9f30")
+
+
+def point_id(video_id: str, start: int):
+    # the same chunk of the same video always gets the same id, so re-ingesting it overwrites it
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{video_id}/{start}"))
+
 
-def load_podcast_chunks(chunks, collection_name, db_client, encoder):
-    for file_name in chunks:
-        docs = []
-        metas = []
+def iter_chunk_batches(chunks, batch_size: int = ENCODE_BATCH_SIZE):
+    # chunks maps file names to their chunks, or streams (file name, chunks) pairs as iter_subtitle_chunks does.
+    # batches span file boundaries, so short videos don't produce small batches
+    docs = []
+    metas = []
 
-        for data in chunks[file_name]:
+    for _, file_chunks in chunks.items() if isinstance(chunks, Mapping) else chunks:
+        for data in file_chunks:
             docs.append(data["text"])
             metas.append({
                 "file_name": data["file_name"],
@@ -18,24 +31,70 @@ def load_podcast_chunks(chunks, collection_name, db_client, encoder):
                 "video_id": data["video_id"]
             })
 
-        db_client.upload_points(
-            collection_name=collection_name,
-            points=[
-                models.PointStruct(
-                    id=str(uuid.uuid1()),
-                    vector=encoder.encode(docs[index]).tolist(),
-                    payload=metas[index],
-                )
-                for index in range(len(docs))
-            ],
-        )
+            if len(docs) == batch_size:
+                yield docs, metas
+                docs = []
+                metas = []
 
+    if docs:
+        yield docs, metas
 
-def store_subtitle_data(chunks, collection_name: str, client, encoder):
-    if client.collection_exists(collection_name=collection_name):
-        print(f"Removing existing collection called: {collection_name}.")
-        client.delete_collection(collection_name=collection_name)
 
+def encode_batch(encoder, docs, batch_size: int = ENCODE_BATCH_SIZE, cache=None) -> np.ndarray:
+    # only the chunks missing from the cache are sent to the encoder
+    vectors = cache.get_many(docs) if cache is not None else {}
+    missing = [index for index in range(len(docs)) if index not in vectors]
+
+    if missing:
+        encoded = encoder.encode(
+            [docs[index] for index in missing],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+        if cache is not None:
+            cache.put_many([docs[index] for index in missing], encoded)
+        vectors.update(zip(missing, encoded))
+
+    return np.stack([vectors[index] for index in range(len(docs))])
+
+
+def upload_batch(db_client, collection_name, vectors: np.ndarray, metas):
+    db_client.upload_collection(
+        collection_name=collection_name,
+        vectors=vectors,
+        payload=metas,
+        ids=[point_id(meta["video_id"], meta["start"]) for meta in metas],
+    )
+
+
+def load_podcast_chunks(
+        chunks,
+        collection_name,
+        db_client,
+        encoder,
+        batch_size: int = ENCODE_BATCH_SIZE,
+        cache=None
+):
+    # encoding batch N + 1 overlaps with the upload of batch N on the uploader thread
+    loaded = 0
+    pending = None
+
+    with ThreadPoolExecutor(max_workers=1) as uploader:
+        for docs, metas in iter_chunk_batches(chunks, batch_size):
+            vectors = encode_batch(encoder, docs, batch_size, cache)
+            if pending is not None:
+                pending.result()
+            pending = uploader.submit(upload_batch, db_client, collection_name, vectors, metas)
+            loaded += len(docs)
+
+        if pending is not None:
+            pending.result()
+
+    return loaded
+
+
+def create_collection(client, collection_name: str, encoder):
     client.create_collection(
         collection_name=collection_name,
         vectors_config=models.VectorParams(
@@ -45,5 +104,74 @@ def store_subtitle_data(chunks, collection_name: str, client, encoder):
     )
     print(f"Created a new collection named: {collection_name}")
 
+
+def load_and_report(chunks, collection_name: str, client, encoder, batch_size: int, cache):
+    loaded = load_podcast_chunks(chunks, collection_name, client, encoder, batch_size, cache)
+
+    if cache is not None:
+        print(f"Embedding cache: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate():.1%} hit rate)")
+    return loaded
+
+
+def store_subtitle_data(
+        chunks,
+        collection_name: str,
+        client,
+        encoder,
+        batch_size: int = ENCODE_BATCH_SIZE,
+        cache=None
+):
+    if client.collection_exists(collection_name=collection_name):
+        print(f"Removing existing collection called: {collection_name}.")
+        client.delete_collection(collection_name=collection_name)
+
+    create_collection(client, collection_name, encoder)
+
     # Iterate through all files in the directory
-    load_podcast_chunks(chunks, collection_name, client, encoder)
+    return load_and_report(chunks, collection_name, client, encoder, batch_size, cache)
+
+
+def indexed_video_ids(client, collection_name: str):
+    if not client.collection_exists(collection_name=collection_name):
+        return set()
+
+    video_ids = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=SCROLL_SIZE,
+            offset=offset,
+            with_payload=["video_id"],
+            with_vectors=False
+        )
+        video_ids.update(point.payload["video_id"] for point in points)
+        if offset is None:
+            return video_ids
+
+
+def sync_subtitle_data(
+        chunks,
+        removed_video_ids,
+        collection_name: str,
+        client,
+        encoder,
+        batch_size: int = ENCODE_BATCH_SIZE,
+        cache=None
+):
+    # upserts the chunks of new videos and deletes the points of removed ones, the rest is left untouched
+    if not client.collection_exists(collection_name=collection_name):
+        create_collection(client, collection_name, encoder)
+
+    if removed_video_ids:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(must=[
+                    models.FieldCondition(key="video_id", match=models.MatchAny(any=sorted(removed_video_ids)))
+                ])
+            )
+        )
+        print(f"Deleted the points of {len(removed_video_ids)} removed videos")
+
+    return load_and_report(chunks, collection_name, client, encoder, batch_size, cache)
@@ -1,11 +1,13 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import os
 from collections import defaultdict
 import webvtt
 
 
 def get_youtube_id(file_name: str):
-    start = file_name.find("[")
-    end = file_name.find("]")
+    # yt-dlp names files "<title> [<id>].en.vtt" and titles may contain brackets, so the id is the last pair
+    start = file_name.rfind("[")
+    end = file_name.rfind("]")
 
     return file_name[start + 1: end]
 
@@ -31,32 +33,60 @@ def clean_file_name(file_name: str):
     return file_name[:index - 1].strip()
 
 
-def process_subtitle_file(input_path, segment_time_second: int):
+def parse_subtitle_file(input_path, file_name: str, segment_time_second: int):
+    start_time = 0
+    text = {}
+    file_name_clean = clean_file_name(file_name)
+    video_id = get_youtube_id(file_name)
+    captions = webvtt.read(os.path.join(input_path, file_name)).captions
+    last = len(captions) - 1
+    chunks = []
+
+    for index, caption in enumerate(captions):
+        end_time = time_to_seconds(caption.end)
+        for t in caption.text.strip().split("\n"):
+            text[t] = None
+
+        if end_time - start_time >= segment_time_second or index == last:
+
+            chunks.append({
+                "file_name": file_name_clean,
+                "start": start_time,
+                "end": end_time,
+                "text": " ".join(text.keys()),
+                "video_id": video_id
+            })
+
+            text = {}
+            start_time = end_time
+    return file_name_clean, chunks
+
+
+def iter_subtitle_chunks(input_path, segment_time_second: int, video_ids=None, workers=None):
+    # yields (file name, chunks) per file as soon as it is parsed, files are parsed on a process pool
+    # unless workers is 1. video_ids limits parsing to the files of those videos
+    file_names = [
+        file_name for file_name in os.listdir(input_path)
+        if video_ids is None or get_youtube_id(file_name) in video_ids
+    ]
+
+    if workers == 1 or len(file_names) <= 1:
+        for file_name in file_names:
+            yield parse_subtitle_file(input_path, file_name, segment_time_second)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(parse_subtitle_file, input_path, file_name, segment_time_second)
+            for file_name in file_names
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def process_subtitle_file(input_path, segment_time_second: int, video_ids=None, workers=None):
     chunks = defaultdict(list)
 
-    for file_name in os.listdir(input_path):
-        file_path = os.path.join(input_path, file_name)
-
-        start_time = 0
-        text = {}
-        file_name_clean = clean_file_name(file_name)
-        captions = webvtt.read(file_path)
-
-        for caption in captions:
-            end_time = time_to_seconds(caption.end)
-            for t in caption.text.strip().split("\n"):
-                text[t] = None
-
-            if end_time - start_time >= segment_time_second or caption == captions[-1]:
-
-                chunks[file_name_clean].append({
-                    "file_name": file_name_clean,
-                    "start": start_time,
-                    "end": end_time,
-                    "text": " ".join(text.keys()),
-                    "video_id": get_youtube_id(file_name)
-                })
-
-                text = {}
-                start_time = end_time
+    for file_name_clean, file_chunks in iter_subtitle_chunks(input_path, segment_time_second, video_ids, workers):
+        chunks[file_name_clean].extend(file_chunks)
     return chunks
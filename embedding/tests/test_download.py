@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from src.download import DownloadManifest, FixtureSubtitleSource, SubtitleSource, download_playlist
+
+VTT = "WEBVTT\n\n00:00:00.000 --> 00:00:02.000\nhello\n"
+
+
+class ListOnlySource(SubtitleSource):
+
+    def video_ids(self, url: str):
+        return []
+
+
+class CountingSource(FixtureSubtitleSource):
+
+    def __init__(self, fixture_path: str):
+        super().__init__(fixture_path)
+        self.fetched = []
+
+    def fetch(self, video_id: str, input_path: str) -> bool:
+        self.fetched.append(video_id)
+        return super().fetch(video_id, input_path)
+
+
+@pytest.fixture
+def fixtures(tmp_path):
+    fixture_path = tmp_path / "fixtures"
+    fixture_path.mkdir()
+    for video_id in ("aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc"):
+        (fixture_path / f"Episode [Part 1] [{video_id}].en.vtt").write_text(VTT)
+    return fixture_path
+
+
+def test_source_missing_a_method_fails_on_construction():
+    with pytest.raises(TypeError):
+        ListOnlySource()
+
+
+def test_download_resumes_from_the_manifest(fixtures, tmp_path):
+    source = CountingSource(str(fixtures))
+    manifest_path = str(tmp_path / "downloads.json")
+    input_path = str(tmp_path / "subtitles")
+    video_ids = source.video_ids("playlist")
+    DownloadManifest(manifest_path, "playlist", video_ids, {"aaaaaaaaaaa": "done"}).save()
+
+    manifest = DownloadManifest.load(manifest_path, "playlist")
+    downloaded = download_playlist("playlist", input_path, manifest, source, workers=2)
+
+    assert downloaded == video_ids
+    assert sorted(source.fetched) == ["bbbbbbbbbbb", "ccccccccccc"]
+    with open(manifest_path) as file:
+        assert json.load(file)["complete"] is False  # until the caller has stored the subtitles
+
+
+def test_finished_manifest_starts_a_new_load(fixtures, tmp_path):
+    manifest_path = str(tmp_path / "downloads.json")
+    manifest = DownloadManifest(manifest_path, "playlist", ["aaaaaaaaaaa"], {"aaaaaaaaaaa": "done"})
+    manifest.finish()
+
+    assert DownloadManifest.load(manifest_path, "playlist").videos == {}
+
+
+class NoSubtitlesSource(CountingSource):
+    # the video exists but yt-dlp finds no subtitles to write
+
+    def fetch(self, video_id: str, input_path: str) -> bool:
+        self.fetched.append(video_id)
+        return True
+
+
+def test_videos_without_subtitles_are_not_fetched_again(fixtures, tmp_path):
+    source = NoSubtitlesSource(str(fixtures))
+    manifest_path = str(tmp_path / "downloads.json")
+    input_path = str(tmp_path / "subtitles")
+
+    manifest = DownloadManifest.load(manifest_path, "playlist")
+    assert download_playlist("playlist", input_path, manifest, source) == []
+    assert manifest.without_subtitles() == {"aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc"}
+    manifest.finish()
+
+    manifest = DownloadManifest.load(manifest_path, "playlist")
+    assert manifest.done() == [] and len(manifest.without_subtitles()) == 3
+    download_playlist("playlist", input_path, manifest, source)
+    assert len(source.fetched) == 3
@@ -0,0 +1,18 @@
+from src.processor import clean_file_name, get_youtube_id, process_subtitle_file
+
+
+def test_youtube_id_is_read_from_the_last_brackets():
+    assert get_youtube_id("Lecture [Part 1] [abc123XYZ00].en.vtt") == "abc123XYZ00"
+    assert get_youtube_id("Episode 12 [dQw4w9WgXcQ].en.vtt") == "dQw4w9WgXcQ"
+    assert clean_file_name("Lecture [Part 1] [abc123XYZ00].en.vtt") == "Lecture [Part 1]"
+
+
+def test_bracketed_title_is_parsed_when_its_video_is_selected(tmp_path):
+    (tmp_path / "Lecture [Part 1] [abc123XYZ00].en.vtt").write_text(
+        "WEBVTT\n\n00:00:00.000 --> 00:00:02.000\nhello\n\n00:00:02.000 --> 00:00:40.000\nworld\n"
+    )
+
+    chunks = process_subtitle_file(str(tmp_path), 30, video_ids={"abc123XYZ00"}, workers=1)
+
+    assert [chunk["video_id"] for chunk in chunks["Lecture [Part 1]"]] == ["abc123XYZ00"]
+    assert chunks["Lecture [Part 1]"][0]["text"] == "hello world"
@@ -0,0 +1,875 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from qdrant_client import QdrantClient
+
+from src.backends import LocalBackend, QdrantBackend, point_data_bytes
+from src.cache import ResultCache
+from src.factors import FACTORS, ITERATIONS, FactorRecommender
+from src.filters import MovieFilter
+from src.hybrid import CONTENT_MODEL, PREFETCH_LIMIT, HybridRecommender, sentence_transformer_encoder
+from src.loading import CSV_ENGINE, parse_years
+from src.popularity import PopularityTable
+from src.sparse import CHUNK_SIZE, MOVIES_CSV, NEIGHBOUR_WEIGHTINGS, NEIGHBOURS_LIMIT, RATINGS_CSV, Recommender
+
+START_YEAR = 2000
+TOP_K = 7
+SUITE_JSON = os.path.join("data", "benchmarks", "suite.json")
+
+
+def timed(fn, *args, repeat: int = 3):
+    """
+    Run fn(*args) `repeat` times and return the best wall time in seconds together with the last result.
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def scale_ratings(agg_data: pd.DataFrame, factor: int) -> pd.DataFrame:
+    """
+    Replicate the aggregated ratings `factor` times, giving every copy its own block of user ids.
+    """
+    if factor == 1:
+        return agg_data
+    user_span = int(agg_data["userId"].max()) + 1
+    copies = []
+    for copy in range(factor):
+        chunk = agg_data.copy()
+        chunk["userId"] = chunk["userId"] + copy * user_span
+        copies.append(chunk)
+    return pd.concat(copies, ignore_index=True)
+
+
+def convert_with_loop(agg_data: pd.DataFrame):
+    """
+    The original row-by-row builder, kept as the baseline for the sparse benchmark.
+    """
+    sparse_vectors = defaultdict(lambda: {"values": [], "indices": []})
+    for row in agg_data.itertuples():
+        sparse_vectors[row.userId]["indices"].append(int(row.movieId))
+        sparse_vectors[row.userId]["values"].append(row.rating)
+    return sparse_vectors
+
+
+def bench_sparse(recommender: Recommender, args) -> None:
+    movies_df, ratings_df = recommender.load_and_filter_data(args.start_year)
+    agg_ratings_df = recommender.prepare_ratings_data(movies_df, ratings_df)
+
+    print(f"{'scale':>6} {'rows':>10} {'users':>8} {'loop (s)':>10} {'csr (s)':>10} {'speedup':>8}")
+    for factor in args.scales:
+        data = scale_ratings(agg_ratings_df, factor)
+        loop_time, loop_vectors = timed(convert_with_loop, data, repeat=args.repeat)
+        csr_time, csr_vectors = timed(recommender.convert_to_sparse_vectors, data, repeat=args.repeat)
+        assert len(loop_vectors) == len(csr_vectors)
+        print(f"{factor:>5}x {len(data):>10} {len(csr_vectors):>8} "
+              f"{loop_time:>10.3f} {csr_time:>10.3f} {loop_time / csr_time:>7.1f}x")
+
+
+def sample_profiles(agg_data: pd.DataFrame, n_users: int, seed: int = 0) -> dict:
+    """
+    Use the aggregated ratings of `n_users` random users as query profiles.
+    """
+    rng = np.random.default_rng(seed)
+    users = rng.choice(agg_data["userId"].unique(), size=n_users, replace=False)
+    sample = agg_data[agg_data["userId"].isin(users)]
+    return {
+        int(user_id): dict(zip(group["movieId"].astype(int), group["rating"]))
+        for user_id, group in sample.groupby("userId")
+    }
+
+
+def same_recommendations(expected: list, actual: list) -> bool:
+    """
+    Compare two recommendation lists, ignoring the order of movies with equal scores.
+    """
+    if len(expected) != len(actual):
+        return False
+    expected_scores = np.array([score for _, score, _ in expected])
+    actual_scores = np.array([score for _, score, _ in actual])
+    if not np.allclose(expected_scores, actual_scores, rtol=1e-4):
+        return False
+    # Movies tied with the last score may be swapped for one another, all others must match.
+    cutoff = expected_scores[-1] + 1e-4 * abs(expected_scores[-1]) if len(expected) else 0
+    return ({m for _, s, m in expected if s > cutoff} == {m for _, s, m in actual if s > cutoff})
+
+
+def holdout_split(agg_data: pd.DataFrame, n_users: int, fraction: float = 0.2, seed: int = 0):
+    """
+    Hide a random `fraction` of the ratings of `n_users` random users.
+
+    Returns the remaining ratings, the visible ratings of each test user as a query profile,
+    and the held-out movies each test user liked (rated above the global mean).
+    """
+    rng = np.random.default_rng(seed)
+    counts = agg_data["userId"].value_counts()
+    users = rng.choice(counts[counts >= 10].index.to_numpy(), size=n_users, replace=False)
+    hidden = agg_data["userId"].isin(users).to_numpy() & (rng.random(len(agg_data)) < fraction)
+
+    train, test = agg_data[~hidden], agg_data[hidden]
+    visible = train[train["userId"].isin(users)]
+    profiles = {
+        int(user_id): dict(zip(group["movieId"].astype(int), group["rating"]))
+        for user_id, group in visible.groupby("userId")
+    }
+    liked = test[test["rating"] > 0]
+    relevant = {int(user_id): set(group["movieId"].astype(int)) for user_id, group in liked.groupby("userId")}
+    return train, {user_id: profiles[user_id] for user_id in relevant if user_id in profiles}, relevant
+
+
+def recall_at_k(recommendations: list, relevant: set) -> float:
+    return len({movie_id for _, _, movie_id in recommendations} & relevant) / len(relevant)
+
+
+def precision_at_k(recommendations: list, relevant: set, k: int) -> float:
+    return len({movie_id for _, _, movie_id in recommendations[:k]} & relevant) / k
+
+
+def ndcg_at_k(recommendations: list, relevant: set, k: int) -> float:
+    """
+    NDCG with binary relevance: every held-out liked movie counts as relevant.
+    """
+    dcg = sum(1 / np.log2(rank + 2) for rank, (_, _, movie_id) in enumerate(recommendations) if movie_id in relevant)
+    ideal = sum(1 / np.log2(rank + 2) for rank in range(min(k, len(relevant))))
+    return dcg / ideal
+
+
+def build_backend(args):
+    """
+    The backend picked with --backend: the in-memory CSR engine, or Qdrant at --qdrant-url.
+    """
+    if args.backend == "local":
+        return LocalBackend()
+    return QdrantBackend(QdrantClient(location=args.qdrant_url))
+
+
+def build_recommender(args, cache: bool = False) -> Recommender:
+    """
+    A recommender on the --backend, without a result cache unless `cache` so latencies measure searches.
+    """
+    return Recommender(backend=build_backend(args), cache=ResultCache() if cache else ResultCache(max_entries=0))
+
+
+def bench_parity(recommender: Recommender, args) -> None:
+    movies_df, ratings_df = recommender.load_and_filter_data(args.start_year)
+    agg_ratings_df = recommender.prepare_ratings_data(movies_df, ratings_df)
+    sparse_vectors = recommender.convert_to_sparse_vectors(agg_ratings_df)
+
+    qdrant = Recommender(backend=QdrantBackend(QdrantClient(location=args.qdrant_url)))
+    local = Recommender(backend=LocalBackend())
+    for engine in (qdrant, local):
+        engine.setup_collection(delete_existing=True)
+        engine.upload_data(sparse_vectors)
+
+    profiles = sample_profiles(agg_ratings_df, args.users)
+    mismatches, tied = 0, 0
+    for user_id, profile in profiles.items():
+        query = local.to_sparse_vector(profile)
+        neighbours = local.backend.search(query, limit=NEIGHBOURS_LIMIT + 1)
+        if len(neighbours) > NEIGHBOURS_LIMIT and np.isclose(neighbours[-1].score, neighbours[-2].score):
+            # Equal scores at the neighbour cut-off: either engine may keep either user.
+            tied += 1
+            continue
+
+        expected = qdrant.recommend(profile, movies_df, TOP_K)
+        actual = local.recommend(profile, movies_df, TOP_K)
+        if not same_recommendations(expected, actual):
+            mismatches += 1
+            print(f"user {user_id}: qdrant={expected} local={actual}")
+    compared = len(profiles) - tied
+    print(f"{compared - mismatches}/{compared} profiles returned identical recommendations "
+          f"({tied} skipped for tied neighbour scores)")
+    if mismatches:
+        raise SystemExit(1)
+
+
+def bench_batch(recommender: Recommender, args) -> None:
+    recommender = build_recommender(args)
+    movies_df, ratings_df = recommender.load_and_filter_data(args.start_year)
+    agg_ratings_df = recommender.prepare_ratings_data(movies_df, ratings_df)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(agg_ratings_df))
+
+    n_users = agg_ratings_df["userId"].nunique() if args.users is None else args.users
+    profiles = sample_profiles(agg_ratings_df, n_users)
+
+    def one_by_one():
+        return {user_id: recommender.recommend(profile, movies_df, TOP_K) for user_id, profile in profiles.items()}
+
+    single_time, _ = timed(one_by_one, repeat=args.repeat)
+    batch_time, _ = timed(recommender.recommend_batch, profiles, movies_df, TOP_K, repeat=args.repeat)
+    print(f"{args.backend} backend, {len(profiles)} users")
+    print(f"{'recommend':>16}: {single_time:8.3f}s {len(profiles) / single_time:10.1f} users/sec")
+    print(f"{'recommend_batch':>16}: {batch_time:8.3f}s {len(profiles) / batch_time:10.1f} users/sec")
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far, in MB (ru_maxrss is in KB on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_ingest(mode: str, args, results) -> None:
+    """
+    Ingest the ratings in a fresh process so its peak RSS only covers this one mode.
+    """
+    baseline = peak_rss_mb()
+    recommender = build_recommender(args)
+
+    start = time.perf_counter()
+    if mode == "memory":
+        recommender.setup_collection(delete_existing=True)
+        movies_df, ratings_df = recommender.load_and_filter_data(args.start_year, args.ratings)
+        agg_ratings_df = recommender.prepare_ratings_data(movies_df, ratings_df)
+        recommender.upload_data(recommender.convert_to_sparse_vectors(agg_ratings_df))
+    else:
+        recommender.ingest_streaming(args.start_year, args.ratings, args.chunk_size)
+    results.put((mode, time.perf_counter() - start, baseline, peak_rss_mb()))
+
+
+def bench_ingest(recommender: Recommender, args) -> None:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    print(f"{'mode':>10} {'time (s)':>10} {'baseline (MB)':>14} {'peak RSS (MB)':>14}")
+    for mode in ("memory", "streaming"):
+        process = context.Process(target=run_ingest, args=(mode, args, results))
+        process.start()
+        mode, seconds, baseline, peak = results.get()
+        process.join()
+        print(f"{mode:>10} {seconds:>10.2f} {baseline:>14.1f} {peak:>14.1f}")
+
+
+def bench_upload(recommender: Recommender, args) -> None:
+    movies_df, ratings_df = recommender.load_and_filter_data(args.start_year)
+    agg_ratings_df = scale_ratings(recommender.prepare_ratings_data(movies_df, ratings_df), args.scale)
+    sparse_vectors = recommender.convert_to_sparse_vectors(agg_ratings_df)
+    client = QdrantClient(location=args.qdrant_url)
+
+    print(f"{'batch':>6} {'parallel':>8} {'seconds':>8} {'points/sec':>11} {'MB/sec':>8}")
+    for batch_size in args.batch_sizes:
+        for parallel in args.parallel:
+            backend = QdrantBackend(client, batch_size=batch_size, parallel=parallel)
+            backend.setup(delete_existing=True)
+            report = backend.upload(sparse_vectors)
+            print(f"{batch_size:>6} {parallel:>8} {report.seconds:>8.2f} "
+                  f"{report.points_per_second:>11.0f} {report.mb_per_second:>8.2f}")
+
+
+def bench_artifacts(recommender: Recommender, args) -> None:
+    cache_dir = tempfile.mkdtemp()
+    try:
+        def cold():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            return Recommender(backend=LocalBackend()).load_prepared(args.start_year, args.ratings, cache_dir)
+
+        def warm():
+            return Recommender(backend=LocalBackend()).load_prepared(args.start_year, args.ratings, cache_dir)
+
+        cold_time, _ = timed(cold, repeat=args.repeat)
+        warm_time, _ = timed(warm, repeat=args.repeat)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    print(f"cold (parse CSVs, prepare, save): {cold_time:8.3f}s")
+    print(f"warm (hash CSVs, memory-map):     {warm_time:8.3f}s ({cold_time / warm_time:.1f}x faster)")
+
+
+def bench_fanout(recommender: Recommender, args) -> None:
+    recommender = build_recommender(args)
+    movies_df, agg_ratings_df = recommender.load_prepared(args.start_year)
+    train, profiles, relevant = holdout_split(agg_ratings_df, args.users)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(train))
+
+    print(f"{len(profiles)} users, recall@{args.top_k} on held-out liked movies, weighting={args.weighting}")
+    print(f"{'neighbours':>10} {'mean (ms)':>10} {'p99 (ms)':>9} {'recall':>7}")
+    for neighbours in args.neighbours:
+        latencies, recalls = [], []
+        for user_id, profile in profiles.items():
+            start = time.perf_counter()
+            recommendations = recommender.recommend(
+                profile, movies_df, args.top_k,
+                neighbours=neighbours, min_similarity=args.min_similarity, weighting=args.weighting
+            )
+            latencies.append(time.perf_counter() - start)
+            recalls.append(recall_at_k(recommendations, relevant[user_id]))
+        latencies = np.array(latencies) * 1000
+        print(f"{neighbours:>10} {latencies.mean():>10.2f} {np.percentile(latencies, 99):>9.2f} {np.mean(recalls):>7.3f}")
+
+
+def bench_quality(recommender: Recommender, args) -> None:
+    recommender = build_recommender(args)
+    movies_df, agg_ratings_df = recommender.load_prepared(args.start_year)
+    train, profiles, relevant = holdout_split(agg_ratings_df, args.users)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(train))
+
+    print(f"{len(profiles)} users, {args.neighbours} neighbours, metrics @{args.top_k} on held-out liked movies")
+    print(f"{'scoring':>9} {'mean (ms)':>10} {'recall':>7} {'ndcg':>7}")
+    for scoring in ("presence", "rating"):
+        latencies, recalls, ndcgs = [], [], []
+        for user_id, profile in profiles.items():
+            start = time.perf_counter()
+            recommendations = recommender.recommend(
+                profile, movies_df, args.top_k, neighbours=args.neighbours, scoring=scoring
+            )
+            latencies.append(time.perf_counter() - start)
+            recalls.append(recall_at_k(recommendations, relevant[user_id]))
+            ndcgs.append(ndcg_at_k(recommendations, relevant[user_id], args.top_k))
+        print(f"{scoring:>9} {np.mean(latencies) * 1000:>10.2f} {np.mean(recalls):>7.3f} {np.mean(ndcgs):>7.3f}")
+
+
+def bench_items(recommender: Recommender, args) -> None:
+    movies_df, agg_ratings_df = recommender.load_prepared(args.start_year)
+    sparse_vectors = recommender.convert_to_sparse_vectors(scale_ratings(agg_ratings_df, args.scale))
+    index_dir = tempfile.mkdtemp()
+    try:
+        print(f"{'workers':>7} {'build (s)':>10}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            recommender.build_item_index(sparse_vectors, index_dir, workers=workers)
+            print(f"{workers:>7} {time.perf_counter() - start:>10.2f}")
+
+        movie_ids = np.asarray(recommender.item_index.movie_ids)
+        latencies = []
+        for movie_id in np.random.default_rng(0).choice(movie_ids, size=1000).tolist():
+            start = time.perf_counter()
+            recommender.similar_movies(movie_id, TOP_K)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+    latencies = np.array(latencies) * 1e6
+    print(f"similar_movies over {len(movie_ids)} movies: p50 {np.percentile(latencies, 50):.1f}us, "
+          f"p99 {np.percentile(latencies, 99):.1f}us")
+
+
+def bench_engines(recommender: Recommender, args) -> None:
+    recommender = build_recommender(args)
+    movies_df, agg_ratings_df = recommender.load_prepared(args.start_year)
+    train, profiles, relevant = holdout_split(agg_ratings_df, args.users)
+
+    start = time.perf_counter()
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(train))
+    sparse_fit = time.perf_counter() - start
+
+    client = QdrantClient(location=args.qdrant_url) if args.backend == "qdrant" else None
+    factors = FactorRecommender(factors=args.factors, iterations=args.iterations, client=client)
+    start = time.perf_counter()
+    factors.fit(train)
+    if client is not None:
+        factors.setup_collection()
+        factors.upload_factors()
+    factors_fit = time.perf_counter() - start
+
+    engines = (
+        ("sparse", sparse_fit, lambda profile: recommender.recommend(profile, movies_df, args.top_k)),
+        ("als", factors_fit, lambda profile: factors.recommend(profile, movies_df, args.top_k)),
+    )
+    print(f"{len(profiles)} users, metrics @{args.top_k} on held-out liked movies, {args.backend} backend")
+    print(f"{'engine':>7} {'fit (s)':>8} {'mean (ms)':>10} {'p99 (ms)':>9} {'recall':>7} {'ndcg':>7}")
+    for name, fit_seconds, recommend in engines:
+        latencies, recalls, ndcgs = [], [], []
+        for user_id, profile in profiles.items():
+            start = time.perf_counter()
+            recommendations = recommend(profile)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(recall_at_k(recommendations, relevant[user_id]))
+            ndcgs.append(ndcg_at_k(recommendations, relevant[user_id], args.top_k))
+        latencies = np.array(latencies) * 1000
+        print(f"{name:>7} {fit_seconds:>8.2f} {latencies.mean():>10.2f} {np.percentile(latencies, 99):>9.2f} "
+              f"{np.mean(recalls):>7.3f} {np.mean(ndcgs):>7.3f}")
+
+
+def bench_filters(recommender: Recommender, args) -> None:
+    recommender = build_recommender(args)
+    movies_df, agg_ratings_df = recommender.load_prepared(args.start_year)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(agg_ratings_df))
+    profiles = sample_profiles(agg_ratings_df, args.users)
+    filters = MovieFilter(min_year=args.min_year, max_year=args.max_year, genres=tuple(args.genres))
+
+    def filtered(profile):
+        return recommender.recommend(profile, movies_df, args.top_k, filters=filters)
+
+    def post_filtered(profile):
+        recommendations = recommender.recommend(profile, movies_df, args.top_k * args.overfetch)
+        movie_ids = np.array([movie_id for _, _, movie_id in recommendations], dtype=np.int64)
+        keep = recommender.catalog.matches(filters, movie_ids)
+        return [recommendation for recommendation, kept in zip(recommendations, keep) if kept][:args.top_k]
+
+    print(f"{len(profiles)} users, top {args.top_k} with {filters}")
+    print(f"{'strategy':>13} {'mean (ms)':>10} {'p99 (ms)':>9} {'results':>8}")
+    for name, recommend in (("filtered", filtered), ("post-filtered", post_filtered)):
+        latencies, counts = [], []
+        for profile in profiles.values():
+            start = time.perf_counter()
+            counts.append(len(recommend(profile)))
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+        print(f"{name:>13} {latencies.mean():>10.2f} {np.percentile(latencies, 99):>9.2f} {np.mean(counts):>8.2f}")
+
+
+def bench_cache(recommender: Recommender, args) -> None:
+    movies_df, agg_ratings_df = recommender.load_prepared(args.start_year)
+    sparse_vectors = recommender.convert_to_sparse_vectors(agg_ratings_df)
+    profiles = list(sample_profiles(agg_ratings_df, args.users).values())
+
+    # Zipf-like traffic: a few users come back often, most rarely.
+    rng = np.random.default_rng(0)
+    popularity = 1 / np.arange(1, len(profiles) + 1)
+    requests = rng.choice(len(profiles), size=args.requests, p=popularity / popularity.sum())
+
+    print(f"{args.requests} requests over {len(profiles)} profiles, {args.backend} backend")
+    print(f"{'cache':>6} {'mean (ms)':>10} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for cache in (False, True):
+        recommender = build_recommender(args, cache=cache)
+        recommender.load_prepared(args.start_year)
+        recommender.setup_collection(delete_existing=True)
+        recommender.upload_data(sparse_vectors)
+        latencies = []
+        for i in requests.tolist():
+            start = time.perf_counter()
+            recommender.recommend(profiles[i], movies_df, TOP_K)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+        print(f"{'on' if cache else 'off':>6} {latencies.mean():>10.3f} {np.percentile(latencies, 50):>9.3f} "
+              f"{np.percentile(latencies, 99):>9.3f}")
+    print(recommender.cache.stats())
+
+
+def bench_storage(recommender: Recommender, args) -> None:
+    movies_df, agg_ratings_df = recommender.load_prepared(args.start_year)
+    train, profiles, relevant = holdout_split(agg_ratings_df, args.users)
+    sparse_vectors = recommender.convert_to_sparse_vectors(train)
+    baseline_bytes = point_data_bytes(sparse_vectors)
+    baseline = None
+
+    print(f"{len(profiles)} users, {len(sparse_vectors.indices)} stored ratings, {args.backend} backend")
+    print(f"{'values':>7} {'payload':>7} {'MB':>7} {'saved':>6} {'mean (ms)':>10} {'same top-k':>10} {'recall':>7}")
+    for value_dtype, movie_id_payload in (("float32", True), ("float32", False), ("float16", False), ("uint8", False)):
+        if args.backend == "local":
+            backend = LocalBackend(value_dtype=value_dtype)
+        else:
+            backend = QdrantBackend(
+                QdrantClient(location=args.qdrant_url),
+                value_dtype=value_dtype, on_disk=args.on_disk, movie_id_payload=movie_id_payload
+            )
+        configured = Recommender(backend=backend, cache=ResultCache(max_entries=0))
+        configured.load_prepared(args.start_year)
+        configured.setup_collection(delete_existing=True)
+        configured.upload_data(sparse_vectors)
+        nbytes = point_data_bytes(sparse_vectors, value_dtype, movie_id_payload)
+
+        latencies, recommended = [], {}
+        for user_id, profile in profiles.items():
+            start = time.perf_counter()
+            recommended[user_id] = configured.recommend(profile, movies_df, args.top_k)
+            latencies.append(time.perf_counter() - start)
+        baseline = baseline or recommended
+        same = np.mean([
+            len({movie_id for *_, movie_id in recommended[user_id]} & {movie_id for *_, movie_id in movies})
+            / max(len(movies), 1)
+            for user_id, movies in baseline.items()
+        ])
+        recall = np.mean([recall_at_k(recommended[user_id], relevant[user_id]) for user_id in profiles])
+        print(f"{value_dtype:>7} {'yes' if movie_id_payload else 'no':>7} {nbytes / 1e6:>7.2f} "
+              f"{1 - nbytes / baseline_bytes:>6.0%} {np.mean(latencies) * 1000:>10.2f} {same:>10.3f} {recall:>7.3f}")
+
+
+def time_split(ratings_df: pd.DataFrame, test_fraction: float):
+    """
+    Split raw ratings at the timestamp leaving the latest `test_fraction` of them for testing.
+    """
+    cutoff = ratings_df["timestamp"].quantile(1 - test_fraction)
+    before = (ratings_df["timestamp"] < cutoff).to_numpy()
+    return ratings_df[before].copy(), ratings_df[~before].copy(), int(cutoff)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten_metrics(results: dict, prefix: str = "") -> dict:
+    """
+    The numeric leaves of a suite result as {"stages.load.seconds": 0.12, ...}.
+    """
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_results(previous: dict, current: dict) -> None:
+    old, new = flatten_metrics(previous), flatten_metrics(current)
+    print(f"\nChanges against {previous['commit']} ({previous['created']}):")
+    for name in sorted(old.keys() & new.keys()):
+        if name.startswith("config."):
+            continue
+        change = (new[name] - old[name]) / old[name] if old[name] else 0.0
+        print(f"{name:>30} {old[name]:>12.4f} {new[name]:>12.4f} {change:>+8.1%}")
+
+
+def bench_suite(recommender: Recommender, args) -> None:
+    recommender = build_recommender(args)
+    baseline_rss = peak_rss_mb()
+    stages = {}
+
+    @contextmanager
+    def stage(name: str):
+        start = time.perf_counter()
+        yield
+        stages[name] = {"seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()}
+
+    with stage("load"):
+        movies_df, ratings_df = recommender.load_and_filter_data(args.start_year, args.ratings)
+    with stage("split"):
+        train_df, test_df, cutoff = time_split(ratings_df, args.test_fraction)
+        # Popularity is counted from the ratings before the cutoff only, like the neighbours.
+        recommender.popularity = PopularityTable.from_ratings(train_df)
+    with stage("prepare"):
+        agg_train = recommender.prepare_ratings_data(movies_df, train_df)
+    with stage("convert"):
+        sparse_vectors = recommender.convert_to_sparse_vectors(agg_train)
+    with stage("upload"):
+        recommender.setup_collection(delete_existing=True)
+        recommender.upload_data(sparse_vectors)
+
+    # Test users are those with ratings on both sides of the cutoff; they liked a movie rated above the mean.
+    mean, _ = recommender.normalization
+    liked = test_df[test_df["rating"] > mean]
+    test_users = np.intersect1d(liked["userId"].unique(), agg_train["userId"].unique())
+    if args.users is not None and len(test_users) > args.users:
+        test_users = np.random.default_rng(0).choice(test_users, size=args.users, replace=False)
+    known = agg_train[agg_train["userId"].isin(test_users)]
+    profiles = {
+        int(user_id): dict(zip(group["movieId"].astype(int), group["rating"]))
+        for user_id, group in known.groupby("userId")
+    }
+    relevant = {
+        int(user_id): set(group["movieId"].astype(int))
+        for user_id, group in liked[liked["userId"].isin(test_users)].groupby("userId")
+    }
+
+    latencies, recommendations = [], {}
+    with stage("recommend"):
+        for user_id, profile in profiles.items():
+            start = time.perf_counter()
+            recommendations[user_id] = recommender.recommend(profile, movies_df, args.top_k)
+            latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+
+    k = args.top_k
+    results = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "backend": args.backend, "start_year": args.start_year, "ratings": args.ratings,
+            "test_fraction": args.test_fraction, "cutoff": cutoff, "top_k": k,
+            "users": len(profiles), "train_ratings": len(agg_train), "test_ratings": len(test_df)
+        },
+        "baseline_rss_mb": baseline_rss,
+        "stages": stages,
+        "recommend": {
+            "qps": len(latencies) / stages["recommend"]["seconds"],
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99))
+        },
+        "quality": {
+            f"precision@{k}": float(np.mean([precision_at_k(recommendations[u], relevant[u], k) for u in profiles])),
+            f"recall@{k}": float(np.mean([recall_at_k(recommendations[u], relevant[u]) for u in profiles])),
+            f"ndcg@{k}": float(np.mean([ndcg_at_k(recommendations[u], relevant[u], k) for u in profiles]))
+        }
+    }
+
+    print(f"{len(profiles)} test users after {datetime.datetime.fromtimestamp(cutoff, datetime.timezone.utc):%Y-%m-%d}")
+    print(f"{'stage':>10} {'seconds':>8} {'peak RSS (MB)':>14}   (before loading: {baseline_rss:.1f} MB)")
+    for name, timing in stages.items():
+        print(f"{name:>10} {timing['seconds']:>8.3f} {timing['peak_rss_mb']:>14.1f}")
+    print(", ".join(f"{name} {value:.2f}" for name, value in results["recommend"].items()))
+    print(", ".join(f"{name} {value:.3f}" for name, value in results["quality"].items()))
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            compare_results(json.load(previous_file), results)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+def bench_loading(recommender: Recommender, args) -> None:
+    engines = ["c", "pyarrow"] if CSV_ENGINE == "pyarrow" else ["c"]
+    print(f"{'engine':>8} {'total (s)':>10}  per stage (s)")
+    for engine in engines:
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            movies_df, ratings_df = recommender.load_and_filter_data(args.start_year, args.ratings, engine=engine)
+            recommender.prepare_ratings_data(movies_df, ratings_df)
+            total = time.perf_counter() - start
+            if best is None or total < best[0]:
+                best = (total, dict(recommender.stage_seconds))
+        total, stages = best
+        print(f"{engine:>8} {total:>10.3f}  " + ", ".join(f"{name} {seconds:.3f}" for name, seconds in stages.items()))
+
+    titles = pd.read_csv(MOVIES_CSV)["title"].repeat(args.title_scale).reset_index(drop=True)
+    regex_time, _ = timed(
+        lambda: pd.to_numeric(titles.str.extract(r"\((\d{4})\)", expand=False), errors="coerce"), repeat=args.repeat
+    )
+    slice_time, _ = timed(parse_years, titles, repeat=args.repeat)
+    print(f"Years of {len(titles)} titles: regex {regex_time * 1000:.1f} ms, suffix slicing {slice_time * 1000:.1f} ms")
+
+
+def bench_coldstart(recommender: Recommender, args) -> None:
+    recommender = build_recommender(args)
+    recommender.cold_start_threshold = 0  # Always search, the table is queried explicitly below
+    movies_df, ratings_df = recommender.load_and_filter_data(args.start_year)
+    agg_ratings_df = recommender.prepare_ratings_data(movies_df, ratings_df)
+    train, profiles, relevant = holdout_split(agg_ratings_df, args.users)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(train))
+    # Count popularity from the training ratings only, the held-out ones are what recall measures.
+    recommender.popularity = PopularityTable.from_ratings(ratings_df.merge(train[["userId", "movieId"]]))
+
+    strategies = {
+        "search": lambda profile: recommender.recommend(profile, movies_df, args.top_k),
+        "trending": lambda profile: recommender.popular_movies(args.top_k, profile, movies_df, ranking="trending"),
+        "popular": lambda profile: recommender.popular_movies(args.top_k, profile, movies_df, ranking="popular"),
+    }
+    print(f"{len(profiles)} users, recall@{args.top_k} on held-out liked movies from their first n ratings")
+    print(f"{'n':>4} {'strategy':>9} {'mean (us)':>10} {'recall':>7}")
+    for size in args.sizes:
+        for name, recommend in strategies.items():
+            latencies, recalls = [], []
+            for user_id, profile in profiles.items():
+                small = dict(list(profile.items())[:size])
+                start = time.perf_counter()
+                recommendations = recommend(small)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(recall_at_k(recommendations, relevant[user_id]))
+            print(f"{size:>4} {name:>9} {np.mean(latencies) * 1e6:>10.1f} {np.mean(recalls):>7.3f}")
+
+
+def hashed_text_encoder(dims: int = 512):
+    """
+    Bag-of-words encoder hashing each word of a text into one of `dims` buckets, to run the hybrid
+    benchmark without downloading a SentenceTransformer model.
+    """
+    def encode(texts):
+        vectors = np.zeros((len(texts), dims), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"[a-z0-9]+", text.lower()):
+                vectors[row, zlib.crc32(word.encode()) % dims] += 1
+        return vectors
+
+    return encode
+
+
+def bench_hybrid(recommender: Recommender, args) -> None:
+    recommender = build_recommender(args)
+    movies_df, agg_ratings_df = recommender.load_prepared(args.start_year)
+    train, profiles, relevant = holdout_split(agg_ratings_df, args.users)
+    sparse_vectors = recommender.convert_to_sparse_vectors(train)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(sparse_vectors)
+
+    encoder = hashed_text_encoder() if args.encoder == "hashed" else sentence_transformer_encoder(args.model)
+    client = QdrantClient(location=args.qdrant_url) if args.backend == "qdrant" else None
+    hybrid = HybridRecommender(encoder=encoder, client=client, prefetch_limit=args.prefetch_limit)
+    start = time.perf_counter()
+    hybrid.fit(movies_df, sparse_vectors)
+    if client is not None:
+        hybrid.setup_collection()
+        hybrid.upload()
+    fit_seconds = time.perf_counter() - start
+
+    counts = train["movieId"].value_counts()
+    engines = (
+        ("sparse", lambda profile: recommender.recommend(profile, movies_df, args.top_k)),
+        ("hybrid", lambda profile: hybrid.recommend(profile, movies_df, args.top_k)),
+    )
+    print(f"{len(profiles)} users, metrics @{args.top_k} on held-out liked movies, {args.backend} backend, "
+          f"{args.encoder} content vectors fitted in {fit_seconds:.2f}s")
+    print(f"{'engine':>7} {'mean (ms)':>10} {'p99 (ms)':>9} {'recall':>7} {'ndcg':>7} {'tail':>6}")
+    for name, recommend in engines:
+        latencies, recalls, ndcgs, tail = [], [], [], []
+        for user_id, profile in profiles.items():
+            start = time.perf_counter()
+            recommendations = recommend(profile)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(recall_at_k(recommendations, relevant[user_id]))
+            ndcgs.append(ndcg_at_k(recommendations, relevant[user_id], args.top_k))
+            tail.extend(counts.get(movie_id, 0) < args.tail_ratings for _, _, movie_id in recommendations)
+        latencies = np.array(latencies) * 1000
+        print(f"{name:>7} {latencies.mean():>10.2f} {np.percentile(latencies, 99):>9.2f} "
+              f"{np.mean(recalls):>7.3f} {np.mean(ndcgs):>7.3f} {np.mean(tail):>6.1%}")
+    print(f"tail: share of recommended movies with fewer than {args.tail_ratings} training ratings")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the recsys pipeline.")
+    parser.add_argument("--start-year", type=int, default=START_YEAR)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best one is reported")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    sparse_parser = subparsers.add_parser("sparse", help="Sparse vector builder: CSR arrays vs the row loop")
+    sparse_parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    sparse_parser.set_defaults(run=bench_sparse)
+
+    parity_parser = subparsers.add_parser("parity", help="Check that the local backend matches Qdrant")
+    parity_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    parity_parser.add_argument("--users", type=int, default=50, help="Number of user profiles to compare")
+    parity_parser.set_defaults(run=bench_parity)
+
+    batch_parser = subparsers.add_parser("batch", help="Users/sec of recommend_batch vs one recommend per user")
+    batch_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    batch_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    batch_parser.add_argument("--users", type=int, default=None, help="Number of users to score, all by default")
+    batch_parser.set_defaults(run=bench_batch)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Wall time and peak RSS of in-memory vs streaming ingest")
+    ingest_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    ingest_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    ingest_parser.add_argument("--ratings", default=RATINGS_CSV, help="Ratings CSV, e.g. a 25M MovieLens dump")
+    ingest_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    ingest_parser.set_defaults(run=bench_ingest)
+
+    upload_parser = subparsers.add_parser("upload", help="Qdrant upload throughput across batch sizes and workers")
+    upload_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    upload_parser.add_argument("--scale", type=int, default=10, help="Replicate ratings.csv users this many times")
+    upload_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[64, 256, 1024])
+    upload_parser.add_argument("--parallel", type=int, nargs="+", default=[1, 4, 8])
+    upload_parser.set_defaults(run=bench_upload)
+
+    artifacts_parser = subparsers.add_parser("artifacts", help="Cold vs warm startup with cached preprocessing")
+    artifacts_parser.add_argument("--ratings", default=RATINGS_CSV)
+    artifacts_parser.set_defaults(run=bench_artifacts)
+
+    fanout_parser = subparsers.add_parser("fanout", help="Latency vs recall across neighbour fan-outs")
+    fanout_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    fanout_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    fanout_parser.add_argument("--users", type=int, default=100, help="Number of users with held-out ratings")
+    fanout_parser.add_argument("--top-k", type=int, default=20)
+    fanout_parser.add_argument("--neighbours", type=int, nargs="+", default=[5, 10, 20, 50, 100, 200])
+    fanout_parser.add_argument("--min-similarity", type=float, default=None)
+    fanout_parser.add_argument("--weighting", choices=sorted(NEIGHBOUR_WEIGHTINGS), default="linear")
+    fanout_parser.set_defaults(run=bench_fanout)
+
+    quality_parser = subparsers.add_parser("quality", help="Recall/NDCG and latency of presence vs rating scoring")
+    quality_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    quality_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    quality_parser.add_argument("--users", type=int, default=100, help="Number of users with held-out ratings")
+    quality_parser.add_argument("--top-k", type=int, default=20)
+    quality_parser.add_argument("--neighbours", type=int, default=NEIGHBOURS_LIMIT)
+    quality_parser.set_defaults(run=bench_quality)
+
+    items_parser = subparsers.add_parser("items", help="Item index build time per worker count and lookup latency")
+    items_parser.add_argument("--scale", type=int, default=1, help="Replicate ratings.csv users this many times")
+    items_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    items_parser.set_defaults(run=bench_items)
+
+    engines_parser = subparsers.add_parser(
+        "engines", help="Sparse neighbours vs ALS factors: fit time, latency, quality"
+    )
+    engines_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    engines_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    engines_parser.add_argument("--users", type=int, default=100, help="Number of users with held-out ratings")
+    engines_parser.add_argument("--top-k", type=int, default=20)
+    engines_parser.add_argument("--factors", type=int, default=FACTORS)
+    engines_parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    engines_parser.set_defaults(run=bench_engines)
+
+    filters_parser = subparsers.add_parser("filters", help="Filtered search vs post-filtering the recommendations")
+    filters_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    filters_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    filters_parser.add_argument("--users", type=int, default=100, help="Number of user profiles to score")
+    filters_parser.add_argument("--top-k", type=int, default=TOP_K)
+    filters_parser.add_argument("--min-year", type=int, default=2010)
+    filters_parser.add_argument("--max-year", type=int, default=None)
+    filters_parser.add_argument("--genres", nargs="*", default=["Horror"])
+    filters_parser.add_argument("--overfetch", type=int, default=5,
+                                help="Post-filtering asks for top-k times this many recommendations")
+    filters_parser.set_defaults(run=bench_filters)
+
+    cache_parser = subparsers.add_parser("cache", help="Latency and hit rate of the result cache on repeated users")
+    cache_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    cache_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    cache_parser.add_argument("--users", type=int, default=200, help="Number of distinct user profiles")
+    cache_parser.add_argument("--requests", type=int, default=2000)
+    cache_parser.set_defaults(run=bench_cache)
+
+    storage_parser = subparsers.add_parser("storage", help="Memory, latency and accuracy of quantized storage")
+    storage_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    storage_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    storage_parser.add_argument("--on-disk", action="store_true", help="Keep the Qdrant sparse index on disk")
+    storage_parser.add_argument("--users", type=int, default=100, help="Number of users with held-out ratings")
+    storage_parser.add_argument("--top-k", type=int, default=20)
+    storage_parser.set_defaults(run=bench_storage)
+
+    suite_parser = subparsers.add_parser("suite", help="Time-split evaluation of the whole pipeline, saved as JSON")
+    suite_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    suite_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    suite_parser.add_argument("--ratings", default=RATINGS_CSV)
+    suite_parser.add_argument("--test-fraction", type=float, default=0.2, help="Latest share of ratings to test on")
+    suite_parser.add_argument("--users", type=int, default=500, help="Test users to sample, all when not given")
+    suite_parser.add_argument("--top-k", type=int, default=10)
+    suite_parser.add_argument("--output", default=SUITE_JSON, help="Where to write the results")
+    suite_parser.add_argument("--compare", default=None, help="Earlier results file to print changes against")
+    suite_parser.set_defaults(run=bench_suite)
+
+    loading_parser = subparsers.add_parser("loading", help="CSV engines and year parsing of load_and_filter_data")
+    loading_parser.add_argument("--ratings", default=RATINGS_CSV, help="Ratings CSV, e.g. a 25M MovieLens dump")
+    loading_parser.add_argument("--title-scale", type=int, default=10, help="Replicate movie titles this many times")
+    loading_parser.set_defaults(run=bench_loading)
+
+    coldstart_parser = subparsers.add_parser("coldstart", help="Neighbour search vs popularity for small profiles")
+    coldstart_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    coldstart_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    coldstart_parser.add_argument("--users", type=int, default=100, help="Number of users with held-out ratings")
+    coldstart_parser.add_argument("--top-k", type=int, default=20)
+    coldstart_parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 3, 5, 10])
+    coldstart_parser.set_defaults(run=bench_coldstart)
+
+    hybrid_parser = subparsers.add_parser("hybrid", help="Sparse neighbours vs content + collaborative fusion")
+    hybrid_parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    hybrid_parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant URL, or :memory: for a local client")
+    hybrid_parser.add_argument("--users", type=int, default=100, help="Number of users with held-out ratings")
+    hybrid_parser.add_argument("--top-k", type=int, default=20)
+    hybrid_parser.add_argument("--encoder", choices=["model", "hashed"], default="model",
+                               help="SentenceTransformer --model, or hashed words of title and genres")
+    hybrid_parser.add_argument("--model", default=CONTENT_MODEL)
+    hybrid_parser.add_argument("--prefetch-limit", type=int, default=PREFETCH_LIMIT)
+    hybrid_parser.add_argument("--tail-ratings", type=int, default=5, help="Movies with fewer ratings are long tail")
+    hybrid_parser.set_defaults(run=bench_hybrid)
+
+    args = parser.parse_args()
+    args.run(Recommender(), args)
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+import numpy as np
+from qdrant_client import models
+from qdrant_client.http.models import SparseVector
+
+from src.async_recommender import AsyncRecommender
+from src.backends import POOL_SIZE, AsyncSearchBackend, LocalBackend
+from src.cache import ResultCache
+from src.filters import MovieFilter
+
+START_YEAR = 2000
+TOP_K = 7
+
+
+class StandInBackend(AsyncSearchBackend):
+    """
+    Local stand-in for a Qdrant server: answers from a LocalBackend after a simulated round trip,
+    during which the event loop is free to serve other requests.
+    """
+
+    def __init__(self, backend: LocalBackend, round_trip_seconds: float):
+        self.backend = backend
+        self.round_trip_seconds = round_trip_seconds
+
+    async def search(
+            self,
+            query: SparseVector,
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[models.ScoredPoint]:
+        await asyncio.sleep(self.round_trip_seconds)
+        return self.backend.search(query, limit, score_threshold, with_vectors, query_filter)
+
+    async def search_batch(
+            self,
+            queries: List[SparseVector],
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[List[models.ScoredPoint]]:
+        await asyncio.sleep(self.round_trip_seconds)
+        return self.backend.search_batch(queries, limit, score_threshold, with_vectors, query_filter)
+
+
+def build_recommender(args) -> AsyncRecommender:
+    """
+    An uncached AsyncRecommender on the stand-in, or on the Qdrant server at --qdrant-url.
+    """
+    no_cache = ResultCache(max_entries=0)
+    if args.qdrant_url is None:
+        backend = LocalBackend()
+        return AsyncRecommender(
+            backend=backend,
+            async_backend=StandInBackend(backend, args.round_trip_ms / 1000),
+            cache=no_cache
+        )
+    return AsyncRecommender(args.qdrant_url, cache=no_cache, pool_size=args.pool_size)
+
+
+async def run_level(recommender: AsyncRecommender, profiles: list, movies_df, concurrency: int, requests: int):
+    """
+    Send `requests` recommend calls with at most `concurrency` in flight, return their latencies and wall time.
+    """
+    latencies = []
+    pending = iter(range(requests))
+
+    async def client() -> None:
+        for i in pending:
+            start = time.perf_counter()
+            await recommender.recommend(profiles[i % len(profiles)], movies_df, TOP_K)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return np.array(latencies), time.perf_counter() - start
+
+
+async def main(args) -> None:
+    recommender = build_recommender(args)
+    movies_df, agg_ratings_df = recommender.load_prepared(args.start_year)
+    if args.qdrant_url is None or args.upload:
+        recommender.setup_collection(delete_existing=True)
+        recommender.upload_data(recommender.convert_to_sparse_vectors(agg_ratings_df))
+
+    rng = np.random.default_rng(0)
+    users = rng.permutation(agg_ratings_df["userId"].unique())
+    profiles = [
+        dict(zip(group["movieId"].astype(int), group["rating"]))
+        for _, group in agg_ratings_df[agg_ratings_df["userId"].isin(users[:args.users])].groupby("userId")
+    ]
+
+    target = args.qdrant_url or f"stand-in with {args.round_trip_ms:g} ms round trips"
+    print(f"{args.requests} requests per level over {len(profiles)} profiles, {target}")
+    print(f"{'concurrency':>11} {'qps':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    try:
+        for concurrency in args.concurrency:
+            latencies, seconds = await run_level(recommender, profiles, movies_df, concurrency, args.requests)
+            latencies *= 1000
+            print(f"{concurrency:>11} {len(latencies) / seconds:>8.1f} "
+                  f"{np.percentile(latencies, 50):>9.2f} {np.percentile(latencies, 99):>9.2f}")
+    finally:
+        await recommender.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test AsyncRecommender at increasing concurrency.")
+    parser.add_argument("--start-year", type=int, default=START_YEAR)
+    parser.add_argument("--qdrant-url", default=None,
+                        help="Qdrant server to load, by default a local stand-in with simulated round trips")
+    parser.add_argument("--upload", action="store_true", help="Rebuild the collection on --qdrant-url first")
+    parser.add_argument("--round-trip-ms", type=float, default=5.0, help="Simulated round trip of the stand-in")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE, help="Pooled connections to --qdrant-url")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per concurrency level")
+    parser.add_argument("--users", type=int, default=200, help="Number of distinct user profiles")
+    asyncio.run(main(parser.parse_args()))
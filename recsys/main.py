@@ -1,18 +1,54 @@
-from src.sparse import Recommender
+import argparse
+import os
+
+import pandas as pd
+
+from src.sparse import INGEST_STATE_JSON, ITEM_INDEX_DIR, Recommender
 
 START_YEAR = 2000
 TOP_K = 7  # Number of recommendations to return.
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Movie recommendations from sparse rating vectors.")
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Recreate the collection from scratch instead of syncing new ratings')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Rebuild by reading ratings.csv in chunks, for ratings files larger than memory')
+    parser.add_argument('--item-index', action='store_true',
+                        help='Precompute the "because you watched" item-item similarity index')
+    args = parser.parse_args()
+
     recommender = Recommender()
+    agg_ratings_df = None
 
-    movies_df, ratings_df = recommender.load_and_filter_data(START_YEAR)
-    agg_ratings_df = recommender.prepare_ratings_data(movies_df, ratings_df)
-    sparse_vectors = recommender.convert_to_sparse_vectors(agg_ratings_df)
+    if (args.rebuild or not os.path.exists(INGEST_STATE_JSON)) and args.streaming:
+        # Uploads users as their ratings are read, without holding all ratings in memory.
+        movies_df = recommender.ingest_streaming(START_YEAR)
+        recommender.save_ingest_state()
+    elif args.rebuild or not os.path.exists(INGEST_STATE_JSON):
+        # Reuses the preprocessed tables from data/cache while the CSVs are unchanged.
+        movies_df, agg_ratings_df = recommender.load_prepared(START_YEAR)
+        sparse_vectors = recommender.convert_to_sparse_vectors(agg_ratings_df)
 
-    recommender.setup_collection(delete_existing=True)
-    recommender.upload_data(sparse_vectors)
+        recommender.setup_collection(delete_existing=True)
+        print(f"Uploaded {recommender.upload_data(sparse_vectors)}")
+        print("Ingest stages: " + ", ".join(
+            f"{name} {seconds:.2f}s" for name, seconds in recommender.stage_seconds.items()
+        ))
+        recommender.save_ingest_state()
+    else:
+        # Only users with ratings newer than the last run are re-uploaded.
+        movies_df, updated = recommender.sync_ratings()
+        print(f"Updated {updated} users, watermark is now {recommender.watermark}")
+
+    if args.item_index:
+        if agg_ratings_df is None:
+            # Normalized with the in-memory statistics, load_prepared would reset the synced state.
+            agg_ratings_df = recommender.aggregate_ratings(
+                pd.concat(recommender.read_rating_chunks(movies_df["movieId"].unique()), ignore_index=True)
+            )
+        recommender.build_item_index(recommender.convert_to_sparse_vectors(agg_ratings_df))
 
     # My personal movie ratings (positive: liked, negative: disliked)
     # Should be beyond START YEAR
@@ -32,4 +68,10 @@ if __name__ == "__main__":
 
     recommendations = recommender.recommend(my_ratings, movies_df, TOP_K)
     for title, score, movie_id in recommendations:
-        print(f"{title}: {score:.3f} (ID: {movie_id})")
\ No newline at end of file
+        print(f"{title}: {score:.3f} (ID: {movie_id})")
+
+    if os.path.isdir(ITEM_INDEX_DIR):
+        recommender.load_item_index()
+        print("\nBecause you watched The Matrix Reloaded:")
+        for title, score, movie_id in recommender.similar_movies(6365, TOP_K):
+            print(f"{title}: {score:.3f} (ID: {movie_id})")
\ No newline at end of file
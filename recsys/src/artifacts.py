@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+MOVIE_COLUMNS = ["movieId", "title", "genres", "year"]
+RATING_COLUMNS = ["userId", "movieId", "rating"]
+META_JSON = "meta.json"
+ARRAY_PREFIX = "array_"
+ARTIFACT_VERSION = 2  # Bump when the saved files change, so older artifacts are rebuilt instead of read
+
+
+def file_digest(path: str) -> str:
+    """
+    SHA-256 of a file's contents, read in 1 MB blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while block := source.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_key(source_paths: List[str], start_year: int) -> str:
+    """
+    Cache key for preprocessed data: changes whenever a source file, the year filter or ARTIFACT_VERSION changes.
+    """
+    digest = hashlib.sha256(f"{ARTIFACT_VERSION}:{start_year}".encode())
+    for path in source_paths:
+        digest.update(file_digest(path).encode())
+    return digest.hexdigest()[:32]
+
+
+def save_artifacts(
+        artifact_dir: str,
+        movies_df: pd.DataFrame,
+        agg_ratings_df: pd.DataFrame,
+        meta: Dict,
+        arrays: Optional[Dict[str, np.ndarray]] = None
+) -> None:
+    """
+    Write every column as its own .npy file, strings as fixed-width unicode so they can be memory-mapped,
+    along with any other named `arrays`.
+
+    Files are written to a temporary directory first and moved into place, so readers never see a partial artifact.
+    """
+    parent = os.path.dirname(artifact_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent)
+    try:
+        for prefix, df, columns in (("movies", movies_df, MOVIE_COLUMNS), ("ratings", agg_ratings_df, RATING_COLUMNS)):
+            for column in columns:
+                values = df[column].to_numpy()
+                if values.dtype == object:
+                    values = values.astype(str)
+                np.save(os.path.join(tmp_dir, f"{prefix}_{column}.npy"), values)
+        for name, values in (arrays or {}).items():
+            np.save(os.path.join(tmp_dir, f"{ARRAY_PREFIX}{name}.npy"), values)
+        with open(os.path.join(tmp_dir, META_JSON), "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_dir, artifact_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(artifact_dir):
+            raise
+
+
+def load_artifacts(
+        artifact_dir: str
+) -> Optional[Tuple[pd.DataFrame, pd.DataFrame, Dict, Dict[str, np.ndarray]]]:
+    """
+    Memory-map a saved artifact, or return None when there is none.
+    """
+    meta_path = os.path.join(artifact_dir, META_JSON)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as meta_file:
+        meta = json.load(meta_file)
+
+    def read(prefix: str, columns: List[str]) -> pd.DataFrame:
+        return pd.DataFrame({
+            column: np.load(os.path.join(artifact_dir, f"{prefix}_{column}.npy"), mmap_mode="r")
+            for column in columns
+        }, copy=False)
+
+    arrays = {
+        name[len(ARRAY_PREFIX):-len(".npy")]: np.load(os.path.join(artifact_dir, name), mmap_mode="r")
+        for name in os.listdir(artifact_dir)
+        if name.startswith(ARRAY_PREFIX)
+    }
+    return read("movies", MOVIE_COLUMNS), read("ratings", RATING_COLUMNS), meta, arrays
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import pandas as pd
+
+from .backends import POOL_SIZE, AsyncQdrantBackend, AsyncSearchBackend, SearchBackend, pooled_async_client
+from .cache import ResultCache
+from .filters import MovieFilter
+from .sparse import COLD_START_THRESHOLD, NEIGHBOURS_LIMIT, QDRANT_URL, RecommendOptions, Recommender
+
+
+class AsyncRecommender(Recommender):
+    """
+    A Recommender whose `recommend` and `recommend_batch` are coroutines, so one event loop
+    can keep many requests in flight while their searches wait on Qdrant.
+
+    Searches go through `async_backend`, an AsyncQdrantClient with a connection pool by default.
+    Loading, ingest and updates still run through the synchronous `backend`.
+    """
+
+    def __init__(
+            self,
+            qdrant_url: str = QDRANT_URL,
+            backend: Optional[SearchBackend] = None,
+            async_backend: Optional[AsyncSearchBackend] = None,
+            cache: Optional[ResultCache] = None,
+            pool_size: int = POOL_SIZE,
+            cold_start_threshold: int = COLD_START_THRESHOLD,
+            cold_start_ranking: str = "trending"
+    ):
+        super().__init__(qdrant_url, backend, cache, cold_start_threshold, cold_start_ranking)
+        if async_backend is None:
+            async_backend = AsyncQdrantBackend(pooled_async_client(qdrant_url, pool_size))
+        self.async_backend = async_backend
+
+    async def recommend(
+            self,
+            my_ratings: Dict[int, float],
+            movies_df: pd.DataFrame,
+            top_k: int,
+            neighbours: int = NEIGHBOURS_LIMIT,
+            min_similarity: Optional[float] = None,
+            weighting: str = "linear",
+            scoring: str = "presence",
+            filters: Optional[MovieFilter] = None
+    ) -> List[Tuple[str, float, int]]:
+        """
+        Generate top-k movie recommendations based on user's ratings, as `Recommender.recommend`.
+        """
+        options = RecommendOptions(neighbours, min_similarity, weighting, scoring, filters)
+        profiles = {None: my_ratings}
+        recommendations, cache_keys = self.answer_without_search(profiles, movies_df, top_k, options)
+        if cache_keys:
+            results = await self.async_backend.search(
+                self.to_sparse_vector(my_ratings), **self.search_arguments(options)
+            )
+            recommendations.update(
+                self.recommend_from_results([results], [None], profiles, movies_df, top_k, options, cache_keys)
+            )
+        return recommendations[None]
+
+    async def recommend_batch(
+            self,
+            users_ratings: Dict[Hashable, Dict[int, float]],
+            movies_df: pd.DataFrame,
+            top_k: int,
+            neighbours: int = NEIGHBOURS_LIMIT,
+            min_similarity: Optional[float] = None,
+            weighting: str = "linear",
+            scoring: str = "presence",
+            filters: Optional[MovieFilter] = None
+    ) -> Dict[Hashable, List[Tuple[str, float, int]]]:
+        """
+        Generate top-k recommendations for many rating profiles, as `Recommender.recommend_batch`,
+        with the batch searches of BATCH_SIZE profiles in flight together.
+        """
+        options = RecommendOptions(neighbours, min_similarity, weighting, scoring, filters)
+        recommendations, cache_keys = self.answer_without_search(users_ratings, movies_df, top_k, options)
+        batches = self.search_batches(list(cache_keys))
+        batch_results = await asyncio.gather(*(
+            self.async_backend.search_batch(
+                [self.to_sparse_vector(users_ratings[key]) for key in keys], **self.search_arguments(options)
+            )
+            for keys in batches
+        ))
+        for keys, results in zip(batches, batch_results):
+            recommendations.update(
+                self.recommend_from_results(results, keys, users_ratings, movies_df, top_k, options, cache_keys)
+            )
+
+        return {key: recommendations[key] for key in users_ratings}
+
+    async def close(self) -> None:
+        """
+        Close the pooled connections of the async backend.
+        """
+        await self.async_backend.close()
@@ -0,0 +1,616 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from itertools import islice
+import queue
+import threading
+import time
+from typing import Dict, Generator, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+from qdrant_client.http.models import PointStruct, SparseVector, NamedSparseVector
+from scipy.sparse import csr_matrix, vstack
+
+from .filters import MovieCatalog, MovieFilter
+from .vectors import VALUE_DTYPES, SparseVectors
+
+COLLECTION_NAME = "movies"
+UPLOAD_BATCH_SIZE = 256
+UPLOAD_PARALLEL = 4
+UPLOAD_MAX_RETRIES = 3
+UPLOAD_BACKOFF_SECONDS = 0.5
+POOL_SIZE = 64  # Kept-alive HTTP connections of a pooled async client
+
+
+@dataclass
+class UploadReport:
+    """
+    Throughput of one upload. `nbytes` counts the point data as the collection stores it
+    (vector indices, values and the movie_id payload), not the wire encoding.
+    """
+    points: int
+    nbytes: int
+    seconds: float
+
+    @property
+    def points_per_second(self) -> float:
+        return self.points / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.nbytes / 1e6 / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.points} points in {self.seconds:.2f}s "
+                f"({self.points_per_second:.0f} points/sec, {self.mb_per_second:.2f} MB/sec)")
+
+
+def point_data_bytes(
+        sparse_vectors: SparseVectors,
+        value_dtype: str = "float32",
+        movie_id_payload: bool = True
+) -> int:
+    """
+    Stored size of the point data in `sparse_vectors`: 4 byte vector indices, values of `value_dtype`,
+    and the movie ids again as 8 byte integers when they are also kept as payload.
+    """
+    nnz = len(sparse_vectors.indices)
+    return nnz * (4 + VALUE_DTYPES[value_dtype] + (8 if movie_id_payload else 0))
+
+
+class SearchBackend(ABC):
+    """
+    Storage and nearest-neighbour search for user rating vectors.
+
+    With a `catalog` set, searches accept a MovieFilter that keeps only users who rated matching movies.
+    """
+
+    catalog: Optional[MovieCatalog] = None
+    # Whether search results carry the rated movie ids as payload, otherwise they are read from the vectors.
+    movie_id_payload: bool = True
+
+    def set_catalog(self, catalog: MovieCatalog) -> None:
+        """
+        Use `catalog` for the year and genre payload of uploaded users and for filtered searches.
+        """
+        self.catalog = catalog
+
+    def require_catalog(self) -> MovieCatalog:
+        if self.catalog is None:
+            raise ValueError("Filtered search needs a movie catalog, load the movies first")
+        return self.catalog
+
+    @abstractmethod
+    def setup(self, delete_existing: bool = True) -> None:
+        """
+        Create, or reset, the storage for user vectors.
+        """
+
+    @abstractmethod
+    def upload(self, sparse_vectors: SparseVectors) -> UploadReport:
+        """
+        Store the sparse vectors of every user, replacing the vectors of users already stored.
+        """
+
+    @abstractmethod
+    def retrieve(self, user_ids: List[int]) -> SparseVectors:
+        """
+        Return the stored vectors of `user_ids`, users that are not stored are left out.
+        """
+
+    @abstractmethod
+    def search(
+            self,
+            query: SparseVector,
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[models.ScoredPoint]:
+        """
+        Return the `limit` users with the highest dot product against the query,
+        each with the rated movie ids in its `movie_id` payload unless `movie_id_payload` is off.
+        Users scoring below `score_threshold` are left out, `with_vectors` adds their "ratings" vector.
+        With `query_filter`, only users who rated a movie in its year range and a movie of one of
+        its genres are searched.
+        """
+
+    @abstractmethod
+    def search_batch(
+            self,
+            queries: List[SparseVector],
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[List[models.ScoredPoint]]:
+        """
+        Run `search` for many queries at once, returning one result list per query.
+        """
+
+
+class QdrantBackend(SearchBackend):
+    """
+    Stores user vectors as sparse points in a Qdrant collection.
+
+    Uploads run as a pipeline: one thread builds batches of `batch_size` points while `parallel`
+    threads upsert them, retrying failed requests up to `max_retries` times with exponential backoff.
+
+    To shrink the collection, `value_dtype` stores ratings as "float16" or "uint8" in the sparse index,
+    `on_disk` keeps that index on disk, and `movie_id_payload=False` drops the payload copy of the indices.
+    """
+
+    def __init__(
+            self,
+            client: QdrantClient,
+            collection_name: str = COLLECTION_NAME,
+            batch_size: int = UPLOAD_BATCH_SIZE,
+            parallel: int = UPLOAD_PARALLEL,
+            max_retries: int = UPLOAD_MAX_RETRIES,
+            backoff_seconds: float = UPLOAD_BACKOFF_SECONDS,
+            value_dtype: str = "float32",
+            on_disk: bool = False,
+            movie_id_payload: bool = True
+    ):
+        if value_dtype not in VALUE_DTYPES:
+            raise ValueError(f"Unknown value type {value_dtype!r}, expected one of {sorted(VALUE_DTYPES)}")
+        self.client = client
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.parallel = parallel
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.value_dtype = value_dtype
+        self.on_disk = on_disk
+        self.movie_id_payload = movie_id_payload
+        # The in-process client (":memory:" or a local path) is not thread safe, so its upserts take turns.
+        options = getattr(client, "init_options", {})
+        self.is_local = options.get("location") == ":memory:" or options.get("path") is not None
+        self.upsert_lock = threading.Lock() if self.is_local else nullcontext()
+
+    def generate_points(self, sparse_vectors: SparseVectors) -> Generator[PointStruct, None, None]:
+        """
+        Generate Qdrant PointStruct objects for each user.
+        """
+        for user_id, indices, values in sparse_vectors.items():
+            payload = {"user_id": user_id}
+            if self.catalog is not None:
+                payload.update(self.catalog.payload(indices))
+            indices = indices.tolist()
+            if self.movie_id_payload:
+                payload["movie_id"] = indices
+            yield PointStruct(
+                id=user_id,
+                vector={"ratings": SparseVector(indices=indices, values=values.astype(np.float32).tolist())},
+                payload=payload
+            )
+
+    def setup(self, delete_existing: bool = True) -> None:
+        if delete_existing and self.client.collection_exists(self.collection_name):
+            self.client.delete_collection(self.collection_name)
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config={},
+            sparse_vectors_config={"ratings": models.SparseVectorParams(
+                index=models.SparseIndexParams(on_disk=self.on_disk, datatype=models.Datatype(self.value_dtype))
+            )}
+        )
+        if self.is_local:
+            return  # The in-process client has no payload indexes.
+        # Indexed so filtered searches are resolved by the index instead of scanning payloads.
+        for field_name, schema in (("years", models.PayloadSchemaType.INTEGER),
+                                   ("genres", models.PayloadSchemaType.KEYWORD)):
+            self.client.create_payload_index(self.collection_name, field_name=field_name, field_schema=schema)
+
+    def upload(self, sparse_vectors: SparseVectors) -> UploadReport:
+        start = time.perf_counter()
+        batches = queue.Queue(maxsize=2 * self.parallel)
+        failed = threading.Event()
+
+        def put(item) -> bool:
+            # Give up waiting for a free slot once an uploader has failed, nobody would take it.
+            while not failed.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce() -> None:
+            try:
+                points = self.generate_points(sparse_vectors)
+                while batch := list(islice(points, self.batch_size)):
+                    if not put(batch):
+                        return
+                for _ in range(self.parallel):
+                    put(None)
+            except Exception:
+                failed.set()  # Stops the uploaders, which would otherwise wait for batches forever
+                raise
+
+        def consume() -> None:
+            try:
+                while not failed.is_set():
+                    try:
+                        batch = batches.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if batch is None:
+                        return
+                    self.upsert_with_retry(batch)
+            except Exception:
+                failed.set()
+                raise
+
+        with ThreadPoolExecutor(max_workers=self.parallel + 1) as pool:
+            producer = pool.submit(produce)
+            uploaders = [pool.submit(consume) for _ in range(self.parallel)]
+            for uploader in uploaders:
+                uploader.result()
+            producer.result()
+
+        nbytes = point_data_bytes(sparse_vectors, self.value_dtype, self.movie_id_payload)
+        return UploadReport(len(sparse_vectors), nbytes, time.perf_counter() - start)
+
+    def upsert_with_retry(self, points: List[PointStruct]) -> None:
+        """
+        Upsert one batch, backing off exponentially between failed attempts.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.upsert_lock:
+                    self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+                return
+            except (ResponseHandlingException, UnexpectedResponse):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+
+    def retrieve(self, user_ids: List[int]) -> SparseVectors:
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=user_ids,
+            with_payload=False,
+            with_vectors=["ratings"]
+        )
+        return SparseVectors.from_rows(
+            [point.id for point in points],
+            [point.vector["ratings"].indices for point in points],
+            [point.vector["ratings"].values for point in points]
+        )
+
+    def search(
+            self,
+            query: SparseVector,
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[models.ScoredPoint]:
+        return self.client.search(
+            collection_name=self.collection_name,
+            query_vector=NamedSparseVector(name="ratings", vector=query),
+            query_filter=query_filter.to_qdrant() if query_filter is not None else None,
+            limit=limit,
+            score_threshold=score_threshold,
+            with_vectors=["ratings"] if with_vectors else False
+        )
+
+    def search_batch(
+            self,
+            queries: List[SparseVector],
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[List[models.ScoredPoint]]:
+        qdrant_filter = query_filter.to_qdrant() if query_filter is not None else None
+        return self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=[
+                models.SearchRequest(
+                    vector=NamedSparseVector(name="ratings", vector=query),
+                    filter=qdrant_filter,
+                    limit=limit,
+                    score_threshold=score_threshold,
+                    with_payload=True,
+                    with_vector=["ratings"] if with_vectors else False
+                )
+                for query in queries
+            ]
+        )
+
+
+def pooled_async_client(url: str, pool_size: int = POOL_SIZE) -> AsyncQdrantClient:
+    """
+    An AsyncQdrantClient reusing up to `pool_size` connections, for localhost the client
+    would otherwise open a new connection per request.
+    """
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    return AsyncQdrantClient(url=url, limits=limits)
+
+
+class AsyncSearchBackend(ABC):
+    """
+    Non-blocking nearest-neighbour search over user vectors stored by a SearchBackend,
+    with the same arguments and results as its `search` and `search_batch`.
+    """
+
+    @abstractmethod
+    async def search(
+            self,
+            query: SparseVector,
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[models.ScoredPoint]:
+        pass
+
+    @abstractmethod
+    async def search_batch(
+            self,
+            queries: List[SparseVector],
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[List[models.ScoredPoint]]:
+        pass
+
+    async def close(self) -> None:
+        """
+        Release the connections held by the backend.
+        """
+
+
+class AsyncQdrantBackend(AsyncSearchBackend):
+    """
+    Searches the collection written by QdrantBackend through an AsyncQdrantClient.
+    """
+
+    def __init__(self, client: AsyncQdrantClient, collection_name: str = COLLECTION_NAME):
+        self.client = client
+        self.collection_name = collection_name
+
+    async def search(
+            self,
+            query: SparseVector,
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[models.ScoredPoint]:
+        return await self.client.search(
+            collection_name=self.collection_name,
+            query_vector=NamedSparseVector(name="ratings", vector=query),
+            query_filter=query_filter.to_qdrant() if query_filter is not None else None,
+            limit=limit,
+            score_threshold=score_threshold,
+            with_vectors=["ratings"] if with_vectors else False
+        )
+
+    async def search_batch(
+            self,
+            queries: List[SparseVector],
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[List[models.ScoredPoint]]:
+        qdrant_filter = query_filter.to_qdrant() if query_filter is not None else None
+        return await self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=[
+                models.SearchRequest(
+                    vector=NamedSparseVector(name="ratings", vector=query),
+                    filter=qdrant_filter,
+                    limit=limit,
+                    score_threshold=score_threshold,
+                    with_payload=True,
+                    with_vector=["ratings"] if with_vectors else False
+                )
+                for query in queries
+            ]
+        )
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class LocalBackend(SearchBackend):
+    """
+    Keeps a user x movie CSR matrix in memory and answers searches with sparse dot products.
+
+    Scores match Qdrant's sparse search: float32 dot products, and only users sharing
+    at least one movie with the query are candidates. `value_dtype` rounds stored ratings
+    as a quantized Qdrant collection would, to measure the effect on recommendations.
+    Uploads are kept as separate chunks and merged into the matrix once, on the next read.
+    """
+
+    def __init__(self, value_dtype: str = "float32"):
+        if value_dtype not in VALUE_DTYPES:
+            raise ValueError(f"Unknown value type {value_dtype!r}, expected one of {sorted(VALUE_DTYPES)}")
+        self.value_dtype = value_dtype
+        self.user_ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self.matrix: Optional[csr_matrix] = None
+        self.rated: Optional[csr_matrix] = None
+        self.pending: List[Tuple[np.ndarray, csr_matrix]] = []  # Uploaded (user ids, rows) not merged yet
+        self.eligible: Dict[MovieFilter, np.ndarray] = {}  # Users matching each filter, reset on changes
+
+    def set_catalog(self, catalog: MovieCatalog) -> None:
+        super().set_catalog(catalog)
+        self.eligible.clear()
+
+    def setup(self, delete_existing: bool = True) -> None:
+        self.eligible.clear()
+        if delete_existing or self.matrix is None:
+            self.user_ids = np.empty(0, dtype=np.int64)
+            self.matrix = csr_matrix((0, 0), dtype=np.float32)
+            self.rated = self.binary(self.matrix)
+            self.pending = []
+
+    def upload(self, sparse_vectors: SparseVectors) -> UploadReport:
+        start = time.perf_counter()
+        stored = sparse_vectors.quantized(self.value_dtype)
+        n_movies = int(sparse_vectors.indices.max()) + 1 if len(sparse_vectors.indices) else 0
+        uploaded = csr_matrix(
+            (stored.values, sparse_vectors.indices, sparse_vectors.offsets),
+            shape=(len(sparse_vectors), n_movies)
+        )
+        self.pending.append((sparse_vectors.user_ids, uploaded))
+        self.eligible.clear()
+        nbytes = point_data_bytes(sparse_vectors, self.value_dtype)
+        return UploadReport(len(sparse_vectors), nbytes, time.perf_counter() - start)
+
+    def merge_pending(self) -> None:
+        """
+        Stack the uploaded chunks under the matrix in one go, a re-uploaded user keeping only its latest row.
+        """
+        if not self.pending:
+            return
+        parts = [self.matrix, *(rows for _, rows in self.pending)]
+        user_ids = np.concatenate([self.user_ids, *(ids for ids, _ in self.pending)])
+        n_movies = max(part.shape[1] for part in parts)
+        for part in parts:
+            part.resize((part.shape[0], n_movies))
+        matrix = vstack(parts, format="csr")
+
+        # The last row of every user, in upload order, as if each chunk had replaced the earlier rows.
+        _, last_reversed = np.unique(user_ids[::-1], return_index=True)
+        rows = np.sort(len(user_ids) - 1 - last_reversed)
+        self.matrix = matrix[rows] if len(rows) < len(user_ids) else matrix
+        self.user_ids = user_ids[rows]
+        self.rated = self.binary(self.matrix)
+        self.pending = []
+
+    def retrieve(self, user_ids: List[int]) -> SparseVectors:
+        self.merge_pending()
+        rows = np.flatnonzero(np.isin(self.user_ids, user_ids))
+        return SparseVectors.from_rows(
+            self.user_ids[rows].tolist(),
+            [self.matrix.indices[self.matrix.indptr[row]:self.matrix.indptr[row + 1]] for row in rows],
+            [self.matrix.data[self.matrix.indptr[row]:self.matrix.indptr[row + 1]] for row in rows]
+        )
+
+    def query_matrix(self, queries: List[SparseVector]) -> csr_matrix:
+        """
+        Stack query vectors into a queries x movies CSR matrix, dropping movies no user has rated.
+        """
+        n_movies = self.matrix.shape[1]
+        indices, values, offsets = [], [], [0]
+        for query in queries:
+            query_indices = np.asarray(query.indices, dtype=np.int64)
+            query_values = np.asarray(query.values, dtype=np.float32)
+            known = query_indices < n_movies
+            indices.append(query_indices[known])
+            values.append(query_values[known])
+            offsets.append(offsets[-1] + int(known.sum()))
+        return csr_matrix(
+            (np.concatenate(values), np.concatenate(indices), np.asarray(offsets)),
+            shape=(len(queries), n_movies)
+        )
+
+    def search(
+            self,
+            query: SparseVector,
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[models.ScoredPoint]:
+        return self.search_batch([query], limit, score_threshold, with_vectors, query_filter)[0]
+
+    def search_batch(
+            self,
+            queries: List[SparseVector],
+            limit: int,
+            score_threshold: Optional[float] = None,
+            with_vectors: bool = False,
+            query_filter: Optional[MovieFilter] = None
+    ) -> List[List[models.ScoredPoint]]:
+        self.merge_pending()
+        eligible = self.eligible_users(query_filter) if query_filter is not None else None
+        query_rows = self.query_matrix(queries)
+        scores = (query_rows @ self.matrix.T).tocsr()
+
+        # Users sharing a movie with the query, even if the dot product happens to be zero.
+        overlap = (self.binary(query_rows) @ self.rated.T).tocsr()
+
+        results: List[List[models.ScoredPoint]] = []
+        user_scores = np.zeros(self.matrix.shape[0], dtype=np.float32)
+        for i in range(len(queries)):
+            user_scores[:] = 0
+            row = slice(scores.indptr[i], scores.indptr[i + 1])
+            user_scores[scores.indices[row]] = scores.data[row]
+            candidates = overlap.indices[overlap.indptr[i]:overlap.indptr[i + 1]]
+            if eligible is not None:
+                candidates = candidates[eligible[candidates]]
+            if score_threshold is not None:
+                candidates = candidates[user_scores[candidates] >= score_threshold]
+            results.append(self.scored_points(candidates, user_scores[candidates], limit, with_vectors))
+        return results
+
+    def eligible_users(self, query_filter: MovieFilter) -> np.ndarray:
+        """
+        Mask of the users a filtered Qdrant search would consider, from the same year and genre conditions.
+        """
+        self.merge_pending()
+        if query_filter in self.eligible:
+            return self.eligible[query_filter]
+        catalog = self.require_catalog()
+        movie_ids = np.arange(self.matrix.shape[1])
+        eligible = np.ones(self.matrix.shape[0], dtype=bool)
+        if query_filter.min_year is not None or query_filter.max_year is not None:
+            eligible &= self.rated @ catalog.year_matches(query_filter, movie_ids).astype(np.float32) > 0
+        if query_filter.genres:
+            eligible &= self.rated @ catalog.genre_matches(query_filter, movie_ids).astype(np.float32) > 0
+        self.eligible[query_filter] = eligible
+        return eligible
+
+    @staticmethod
+    def binary(matrix: csr_matrix) -> csr_matrix:
+        """
+        Same sparsity pattern as `matrix` with every stored value set to one.
+        """
+        return csr_matrix(
+            (np.ones_like(matrix.data, dtype=np.float32), matrix.indices, matrix.indptr),
+            shape=matrix.shape
+        )
+
+    def scored_points(
+            self,
+            rows: np.ndarray,
+            scores: np.ndarray,
+            limit: int,
+            with_vectors: bool = False
+    ) -> List[models.ScoredPoint]:
+        """
+        Select the `limit` best rows and wrap them as ScoredPoint, like a Qdrant search would.
+        """
+        if len(rows) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            rows, scores = rows[best], scores[best]
+        order = np.lexsort((rows, -scores))
+
+        points: List[models.ScoredPoint] = []
+        for row, score in zip(rows[order].tolist(), scores[order].tolist()):
+            user_id = int(self.user_ids[row])
+            row_slice = slice(self.matrix.indptr[row], self.matrix.indptr[row + 1])
+            movie_ids = self.matrix.indices[row_slice].tolist()
+            vector = None
+            if with_vectors:
+                vector = {"ratings": SparseVector(indices=movie_ids, values=self.matrix.data[row_slice].tolist())}
+            points.append(models.ScoredPoint(
+                id=user_id,
+                version=0,
+                score=score,
+                payload={"user_id": user_id, "movie_id": movie_ids},
+                vector=vector
+            ))
+        return points
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+CACHE_ENTRIES = 10_000
+CACHE_BYTES = 64 * 1024 * 1024
+CACHE_TTL_SECONDS = 300.0
+
+Recommendations = List[Tuple[str, float, int]]
+
+
+def profile_key(my_ratings: Dict[int, float], **params) -> str:
+    """
+    Stable hash of a rating profile and the request parameters: the same ratings in any order,
+    with NumPy or Python numbers, give the same key.
+    """
+    profile = sorted((int(movie_id), float(rating)) for movie_id, rating in my_ratings.items())
+    payload = json.dumps([profile, sorted((name, repr(value)) for name, value in params.items())])
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def result_bytes(key: str, recommendations: Recommendations) -> int:
+    """
+    Approximate memory held by one cache entry.
+    """
+    size = sys.getsizeof(key) + sys.getsizeof(recommendations)
+    for recommendation in recommendations:
+        size += sys.getsizeof(recommendation) + sum(sys.getsizeof(item) for item in recommendation)
+    return size
+
+
+@dataclass
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    nbytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.1%}), {self.evictions} evictions, "
+                f"{self.entries} entries in {self.nbytes / 1e6:.2f} MB")
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of recommendation lists with a time to live.
+
+    Entries are evicted least recently used first once there are more than `max_entries` of them
+    or they hold more than `max_bytes`. A `max_entries` of 0 disables caching.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = CACHE_ENTRIES,
+            max_bytes: int = CACHE_BYTES,
+            ttl_seconds: Optional[float] = CACHE_TTL_SECONDS,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.entries: OrderedDict[str, Tuple[float, int, Recommendations]] = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Recommendations]:
+        """
+        Return a copy of the cached recommendations, or None when missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and self.clock() - entry[0] > self.ttl_seconds:
+                self.remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[2])
+
+    def put(self, key: str, recommendations: Recommendations) -> None:
+        if self.max_entries <= 0:
+            return
+        nbytes = result_bytes(key, recommendations)
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (self.clock(), nbytes, list(recommendations))
+            self.nbytes += nbytes
+            while len(self.entries) > self.max_entries or self.nbytes > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key: str) -> None:
+        _, nbytes, _ = self.entries.pop(key)
+        self.nbytes -= nbytes
+
+    def clear(self) -> None:
+        """
+        Drop every entry, the hit and miss counters are kept.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self.entries), self.nbytes)
@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from qdrant_client import QdrantClient, models
+from scipy.sparse import csr_matrix
+
+FACTORS_COLLECTION_NAME = "movie_factors"
+FACTORS = 64
+REGULARIZATION = 0.1
+ALPHA = 1.0  # Confidence gained per unit of normalized rating
+ITERATIONS = 15
+BLOCK_NNZ = 16384  # Padded ratings per solver group, each gathers the FACTORS fixed factors of its movie
+BLOCK_BYTES = 64 * 2 ** 20  # Normal equations per solver group, each row solves its own FACTORS x FACTORS system
+
+
+class FactorRecommender:
+    """
+    Implicit-feedback matrix factorization (ALS) over the aggregated ratings of `prepare_ratings_data`.
+
+    A rating above the mean is a positive preference and one below it a negative one, with a confidence
+    of 1 + ALPHA * |rating|. Movie factors are scored in-process, or in a dense Qdrant collection when
+    a client is given. `recommend` returns (title, score, movie_id) like `Recommender.recommend`.
+    """
+
+    def __init__(
+            self,
+            factors: int = FACTORS,
+            regularization: float = REGULARIZATION,
+            alpha: float = ALPHA,
+            iterations: int = ITERATIONS,
+            workers: Optional[int] = None,
+            client: Optional[QdrantClient] = None,
+            collection_name: str = FACTORS_COLLECTION_NAME
+    ):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.workers = workers
+        self.client = client
+        self.collection_name = collection_name
+        self.movie_ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self.movie_factors: Optional[np.ndarray] = None
+        self.movie_index: Optional[Dict[int, str]] = None
+
+    def fit(self, agg_data: pd.DataFrame, seed: int = 0) -> None:
+        """
+        Learn user and movie factors with alternating least squares.
+        """
+        user_ids, user_rows = np.unique(agg_data["userId"].to_numpy(), return_inverse=True)
+        self.movie_ids, movie_columns = np.unique(agg_data["movieId"].to_numpy(), return_inverse=True)
+        ratings = agg_data["rating"].to_numpy(dtype=np.float64)
+
+        shape = (len(user_ids), len(self.movie_ids))
+        confidence = csr_matrix((self.alpha * np.abs(ratings), (user_rows, movie_columns)), shape=shape)
+        preference = csr_matrix(((ratings > 0).astype(np.float64), (user_rows, movie_columns)), shape=shape)
+        confidence_t, preference_t = confidence.T.tocsr(), preference.T.tocsr()
+
+        rng = np.random.default_rng(seed)
+        user_factors = rng.normal(scale=0.01, size=(shape[0], self.factors))
+        movie_factors = rng.normal(scale=0.01, size=(shape[1], self.factors))
+        for _ in range(self.iterations):
+            user_factors = self.solve(movie_factors, confidence, preference)
+            movie_factors = self.solve(user_factors, confidence_t, preference_t)
+        self.movie_factors = movie_factors.astype(np.float32)
+
+    def solve(self, fixed: np.ndarray, confidence: csr_matrix, preference: csr_matrix) -> np.ndarray:
+        """
+        One ALS half step: the least squares factors of every row of `confidence` given the `fixed` factors.
+
+        Rows are sorted by rating count and solved in groups, each group padding its rows' factors into one
+        (rows x count x factors) array so the per-row systems come from a single batched matmul. Groups run
+        on a thread pool; NumPy releases the GIL in matmul and solve, so they use separate cores.
+        """
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors)
+        # sum of c * p * y over each row's movies, c = 1 + extra confidence
+        targets = (preference.multiply(confidence) + preference) @ fixed
+        solved = np.zeros((confidence.shape[0], self.factors))
+        counts = np.diff(confidence.indptr)
+
+        def solve_group(rows: np.ndarray) -> None:
+            width = max(int(counts[rows].max()), 1)
+            positions = confidence.indptr[rows][:, None] + np.arange(width)
+            padded = np.arange(width) >= counts[rows][:, None]
+            positions[padded] = 0
+            neighbours = fixed[confidence.indices[positions]]
+            extra = np.where(padded, 0.0, confidence.data[positions])
+
+            systems = gram + np.matmul(neighbours.transpose(0, 2, 1) * extra[:, None, :], neighbours)
+            solved[rows] = np.linalg.solve(systems, targets[rows][:, :, None])[:, :, 0]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(solve_group, self.row_groups(counts)))
+        return solved
+
+    def row_groups(self, counts: np.ndarray) -> List[np.ndarray]:
+        """
+        Split rows, sorted by count, into groups whose padded size stays under BLOCK_NNZ ratings
+        and whose float64 normal equations stay under BLOCK_BYTES.
+        """
+        max_rows = max(BLOCK_BYTES // (self.factors ** 2 * np.dtype(np.float64).itemsize), 1)
+        order = np.argsort(counts, kind="stable")
+        groups, start = [], 0
+        for end in range(1, len(order) + 1):
+            # The group is padded to the count of its last (largest) row.
+            if (
+                    end == len(order)
+                    or end - start == max_rows
+                    or (end + 1 - start) * counts[order[end]] > BLOCK_NNZ
+            ):
+                groups.append(order[start:end])
+                start = end
+        return groups
+
+    def user_vector(self, my_ratings: Dict[int, float]) -> np.ndarray:
+        """
+        Fold a rating profile into the factor space with one ALS step against the movie factors.
+        """
+        columns = np.searchsorted(self.movie_ids, list(my_ratings))
+        columns = np.minimum(columns, len(self.movie_ids) - 1)
+        known = self.movie_ids[columns] == np.fromiter(my_ratings, dtype=np.int64, count=len(my_ratings))
+        ratings = np.fromiter(my_ratings.values(), dtype=np.float64, count=len(my_ratings))[known]
+        factors = self.movie_factors[columns[known]].astype(np.float64)
+
+        confidence = 1 + self.alpha * np.abs(ratings)
+        preference = (ratings > 0).astype(np.float64)
+        system = (
+            self.movie_factors.T.astype(np.float64) @ self.movie_factors
+            + (factors.T * (confidence - 1)) @ factors
+            + self.regularization * np.eye(self.factors)
+        )
+        return np.linalg.solve(system, factors.T @ (confidence * preference)).astype(np.float32)
+
+    def setup_collection(self, delete_existing: bool = True) -> None:
+        """
+        Create or reset the dense Qdrant collection holding one point per movie.
+        """
+        if delete_existing and self.client.collection_exists(self.collection_name):
+            self.client.delete_collection(self.collection_name)
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=models.VectorParams(size=self.factors, distance=models.Distance.DOT)
+        )
+
+    def upload_factors(self) -> None:
+        """
+        Upload the movie factors to the Qdrant collection, with the movie id as point id.
+        """
+        self.client.upload_collection(
+            collection_name=self.collection_name,
+            vectors=self.movie_factors,
+            ids=self.movie_ids.tolist()
+        )
+
+    def top_movies(self, user_vector: np.ndarray, rated: Dict[int, float], top_k: int) -> List[Tuple[int, float]]:
+        """
+        Return the best (movie_id, score) pairs by dot product, leaving out rated movies.
+        """
+        if self.client is not None:
+            results = self.client.search(
+                collection_name=self.collection_name,
+                query_vector=user_vector.tolist(),
+                limit=top_k + len(rated)
+            )
+            return [(int(point.id), point.score) for point in results if point.id not in rated][:top_k]
+
+        scores = self.movie_factors @ user_vector
+        scores[np.isin(self.movie_ids, list(rated))] = -np.inf
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(self.movie_ids[i]), float(scores[i])) for i in best if np.isfinite(scores[i])]
+
+    def recommend(
+            self,
+            my_ratings: Dict[int, float],
+            movies_df: pd.DataFrame,
+            top_k: int
+    ) -> List[Tuple[str, float, int]]:
+        """
+        Generate top-k movie recommendations based on user's ratings.
+        """
+        if self.movie_index is None:
+            self.movie_index = dict(zip(movies_df["movieId"].astype(int), movies_df["title"]))
+        top_movies = self.top_movies(self.user_vector(my_ratings), my_ratings, top_k)
+        return [
+            (self.movie_index[movie_id], score, movie_id)
+            for movie_id, score in top_movies
+            if movie_id in self.movie_index
+        ]
@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from qdrant_client import models
+
+
+@dataclass(frozen=True)
+class MovieFilter:
+    """
+    Restricts recommendations to movies released in [min_year, max_year], tagged with any of `genres`
+    and not listed in `exclude`. Unset bounds and an empty genre list match every movie.
+    """
+    min_year: Optional[int] = None
+    max_year: Optional[int] = None
+    genres: Tuple[str, ...] = ()
+    exclude: Tuple[int, ...] = ()
+
+    def __post_init__(self):
+        # Lists are accepted but stored as tuples, filters are hashed as cache keys.
+        object.__setattr__(self, "genres", tuple(self.genres))
+        object.__setattr__(self, "exclude", tuple(self.exclude))
+
+    def to_qdrant(self) -> Optional[models.Filter]:
+        """
+        Filter on the "years" and "genres" payload of user points: keeps users who rated a movie
+        in the year range and a movie of one of the genres. The exclude list only applies to candidates.
+        """
+        conditions = []
+        if self.min_year is not None or self.max_year is not None:
+            conditions.append(models.FieldCondition(
+                key="years", range=models.Range(gte=self.min_year, lte=self.max_year)
+            ))
+        if self.genres:
+            conditions.append(models.FieldCondition(key="genres", match=models.MatchAny(any=list(self.genres))))
+        return models.Filter(must=conditions) if conditions else None
+
+
+@dataclass
+class MovieCatalog:
+    """
+    Release year and genres of every movie as arrays aligned with the sorted ``movie_ids``,
+    genres packed as one bit per entry of ``genre_names``.
+    """
+    movie_ids: np.ndarray
+    years: np.ndarray
+    genre_bits: np.ndarray
+    genre_names: List[str]
+
+    @classmethod
+    def from_movies(cls, movies_df: pd.DataFrame) -> "MovieCatalog":
+        movies_df = movies_df.sort_values("movieId")
+        genre_lists = movies_df["genres"].astype(str).str.split("|")
+        genre_names = sorted({genre for genres in genre_lists for genre in genres})
+        if len(genre_names) > 64:
+            raise ValueError(f"At most 64 genres are supported, got {len(genre_names)}")
+        bit = {genre: np.uint64(1) << np.uint64(i) for i, genre in enumerate(genre_names)}
+        genre_bits = np.array(
+            [np.bitwise_or.reduce([bit[genre] for genre in genres]) for genres in genre_lists],
+            dtype=np.uint64
+        )
+        return cls(
+            movie_ids=movies_df["movieId"].to_numpy(dtype=np.int64),
+            years=movies_df["year"].to_numpy(dtype=np.int64),
+            genre_bits=genre_bits,
+            genre_names=genre_names
+        )
+
+    def rows(self, movie_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Catalog rows of `movie_ids` and a mask of the ids that are in the catalog.
+        """
+        rows = np.minimum(np.searchsorted(self.movie_ids, movie_ids), max(len(self.movie_ids) - 1, 0))
+        known = self.movie_ids[rows] == movie_ids if len(self.movie_ids) else np.zeros(len(movie_ids), dtype=bool)
+        return rows, known
+
+    def genre_mask(self, genres: Tuple[str, ...]) -> np.uint64:
+        """
+        Bits of `genres`, unknown genre names match nothing.
+        """
+        bits = [
+            np.uint64(1) << np.uint64(self.genre_names.index(genre))
+            for genre in genres
+            if genre in self.genre_names
+        ]
+        return np.bitwise_or.reduce(bits) if bits else np.uint64(0)
+
+    def year_matches(self, movie_filter: MovieFilter, movie_ids: np.ndarray) -> np.ndarray:
+        rows, known = self.rows(movie_ids)
+        years = self.years[rows]
+        matches = known.copy()
+        if movie_filter.min_year is not None:
+            matches &= years >= movie_filter.min_year
+        if movie_filter.max_year is not None:
+            matches &= years <= movie_filter.max_year
+        return matches
+
+    def genre_matches(self, movie_filter: MovieFilter, movie_ids: np.ndarray) -> np.ndarray:
+        rows, known = self.rows(movie_ids)
+        if not movie_filter.genres:
+            return known
+        return known & (self.genre_bits[rows] & self.genre_mask(movie_filter.genres) != 0)
+
+    def matches(self, movie_filter: MovieFilter, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Mask of the `movie_ids` that pass every condition of `movie_filter`.
+        """
+        matches = self.year_matches(movie_filter, movie_ids) & self.genre_matches(movie_filter, movie_ids)
+        if movie_filter.exclude:
+            matches &= ~np.isin(movie_ids, np.asarray(movie_filter.exclude, dtype=np.int64))
+        return matches
+
+    def payload(self, movie_ids: np.ndarray) -> dict:
+        """
+        The "years" and "genres" payload of a user who rated `movie_ids`, for server-side filtering.
+        """
+        rows, known = self.rows(movie_ids)
+        rows = rows[known]
+        bits = int(np.bitwise_or.reduce(self.genre_bits[rows])) if len(rows) else 0
+        return {
+            "years": np.unique(self.years[rows]).tolist(),
+            "genres": [genre for i, genre in enumerate(self.genre_names) if bits >> i & 1]
+        }
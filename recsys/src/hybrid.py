@@ -0,0 +1,275 @@
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from qdrant_client import QdrantClient, models
+from scipy.sparse import csr_matrix
+
+from .item_index import item_matrix
+from .vectors import SparseVectors
+
+CONTENT_COLLECTION_NAME = "movie_content"
+CONTENT_MODEL = "all-MiniLM-L6-v2"  # The SentenceTransformer of the embedding project
+ENCODE_BATCH_SIZE = 256
+UPLOAD_BATCH_SIZE = 256
+PREFETCH_LIMIT = 100  # Candidates each retriever contributes to the fusion
+RRF_RANK_OFFSET = 2  # Qdrant's reciprocal rank fusion scores rank r (from 0) as 1 / (r + 2)
+QUERY_USERS = 1000  # Largest user weights kept in the collaborative query
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+
+def sentence_transformer_encoder(model_name: str = CONTENT_MODEL, batch_size: int = ENCODE_BATCH_SIZE) -> Encoder:
+    """
+    Encode texts with a SentenceTransformer model, imported on first use as it is an optional dependency.
+    """
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as error:
+        raise ImportError(
+            "Content vectors need sentence-transformers, install the content extra: uv sync --extra content"
+        ) from error
+    model = SentenceTransformer(model_name)
+
+    def encode(texts: List[str]) -> np.ndarray:
+        return model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+    return encode
+
+
+def movie_texts(movies_df: pd.DataFrame) -> List[str]:
+    """
+    The text each movie's content vector is embedded from: its title and genres.
+    """
+    genres = movies_df["genres"].astype(str).str.replace("|", ", ", regex=False)
+    return (movies_df["title"].astype(str) + ". Genres: " + genres).tolist()
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], offset: int = RRF_RANK_OFFSET) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse rankings of row numbers, best first, into (rows, scores) sorted by decreasing fused score.
+    """
+    rows = np.concatenate([np.empty(0, dtype=np.int64), *rankings])
+    scores = np.concatenate([np.empty(0), *(1 / (np.arange(len(ranking)) + offset) for ranking in rankings)])
+    fused_rows, positions = np.unique(rows, return_inverse=True)
+    fused_scores = np.bincount(positions, weights=scores, minlength=len(fused_rows))
+    order = np.argsort(-fused_scores, kind="stable")
+    return fused_rows[order], fused_scores[order]
+
+
+class HybridRecommender:
+    """
+    Movie retrieval fusing a dense content vector per movie, embedded from its title and genres,
+    with a sparse collaborative vector holding the normalized ratings each movie received.
+
+    A profile queries both: the content query is the rating-weighted sum of the rated movies'
+    embeddings, the collaborative query the rating-weighted sum of their rater vectors, which
+    scores a movie by its summed cosine similarity to the rated ones. Each retriever returns
+    its best PREFETCH_LIMIT movies and the two rankings are merged with reciprocal rank fusion,
+    so movies with few or no ratings can still be recommended on content alone.
+
+    Movies are scored in-process, or with one query-API request to a Qdrant collection when
+    a client is given. `recommend` returns (title, score, movie_id) like `Recommender.recommend`.
+    """
+
+    def __init__(
+            self,
+            encoder: Optional[Encoder] = None,
+            client: Optional[QdrantClient] = None,
+            collection_name: str = CONTENT_COLLECTION_NAME,
+            prefetch_limit: int = PREFETCH_LIMIT,
+            query_users: int = QUERY_USERS
+    ):
+        """
+        `encoder` maps a list of texts to one embedding per row, a SentenceTransformer with
+        CONTENT_MODEL by default.
+        """
+        self.encoder = encoder
+        self.client = client
+        self.collection_name = collection_name
+        self.prefetch_limit = prefetch_limit
+        self.query_users = query_users
+        self.movie_ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self.embeddings: Optional[np.ndarray] = None
+        self.raters: Optional[csr_matrix] = None  # Movie x user rows, L2-normalized ratings
+        self.movie_index: Optional[Dict[int, str]] = None
+
+    def fit(self, movies_df: pd.DataFrame, sparse_vectors: SparseVectors) -> None:
+        """
+        Embed every movie of `movies_df` in batches and build the rater vectors from the user vectors.
+        """
+        movies_df = movies_df.sort_values("movieId")
+        self.movie_ids = movies_df["movieId"].to_numpy(dtype=np.int64)
+        self.movie_index = dict(zip(self.movie_ids.tolist(), movies_df["title"]))
+        self.embeddings = self.encode(movie_texts(movies_df))
+
+        rated_ids, items = item_matrix(sparse_vectors)
+        rows, known = self.rows(rated_ids)
+        # Move each rated movie's row to its place among all movies, unrated ones stay empty.
+        placement = csr_matrix(
+            (np.ones(known.sum(), dtype=np.float32), (rows[known], np.flatnonzero(known))),
+            shape=(len(self.movie_ids), len(rated_ids))
+        )
+        self.raters = (placement @ items).tocsr()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        L2-normalized float32 embeddings of `texts`, encoded ENCODE_BATCH_SIZE at a time.
+        """
+        if self.encoder is None:
+            self.encoder = sentence_transformer_encoder()
+        embeddings = np.concatenate([
+            np.asarray(self.encoder(texts[start:start + ENCODE_BATCH_SIZE]), dtype=np.float32)
+            for start in range(0, len(texts), ENCODE_BATCH_SIZE)
+        ])
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return embeddings / norms
+
+    def rows(self, movie_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows of `movie_ids` and a mask of the ids that were fitted.
+        """
+        rows = np.minimum(np.searchsorted(self.movie_ids, movie_ids), max(len(self.movie_ids) - 1, 0))
+        known = self.movie_ids[rows] == movie_ids if len(self.movie_ids) else np.zeros(len(movie_ids), dtype=bool)
+        return rows, known
+
+    def profile_rows(self, my_ratings: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows and ratings of the fitted movies of a profile.
+        """
+        movie_ids = np.fromiter(my_ratings, dtype=np.int64, count=len(my_ratings))
+        ratings = np.fromiter(my_ratings.values(), dtype=np.float32, count=len(my_ratings))
+        rows, known = self.rows(movie_ids)
+        return rows[known], ratings[known]
+
+    def content_query(self, rows: np.ndarray, ratings: np.ndarray) -> Optional[np.ndarray]:
+        query = ratings @ self.embeddings[rows]
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else None
+
+    def collaborative_query(self, rows: np.ndarray, ratings: np.ndarray) -> Optional[models.SparseVector]:
+        """
+        The rating-weighted sum of the rated movies' rater vectors, cut to its QUERY_USERS largest weights.
+        """
+        query = self.raters[rows].T.tocsr() @ ratings
+        users = np.flatnonzero(query)
+        if len(users) > self.query_users:
+            users = users[np.argpartition(-np.abs(query[users]), self.query_users - 1)[:self.query_users]]
+        if len(users) == 0:
+            return None
+        return models.SparseVector(indices=users.tolist(), values=query[users].tolist())
+
+    def setup_collection(self, delete_existing: bool = True) -> None:
+        """
+        Create or reset the Qdrant collection holding one point per movie, with a dense "content"
+        and a sparse "raters" named vector.
+        """
+        if delete_existing and self.client.collection_exists(self.collection_name):
+            self.client.delete_collection(self.collection_name)
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config={
+                "content": models.VectorParams(size=self.embeddings.shape[1], distance=models.Distance.DOT)
+            },
+            sparse_vectors_config={"raters": models.SparseVectorParams()}
+        )
+
+    def generate_points(self) -> Iterator[models.PointStruct]:
+        for row, movie_id in enumerate(self.movie_ids.tolist()):
+            start, end = self.raters.indptr[row], self.raters.indptr[row + 1]
+            vector = {"content": self.embeddings[row].tolist()}
+            if end > start:
+                vector["raters"] = models.SparseVector(
+                    indices=self.raters.indices[start:end].tolist(),
+                    values=self.raters.data[start:end].tolist()
+                )
+            yield models.PointStruct(id=movie_id, vector=vector)
+
+    def upload(self) -> None:
+        """
+        Upload every movie to the Qdrant collection, with the movie id as point id.
+        """
+        self.client.upload_points(self.collection_name, self.generate_points(), batch_size=UPLOAD_BATCH_SIZE)
+
+    def top_movies(self, my_ratings: Dict[int, float], top_k: int) -> List[Tuple[int, float]]:
+        """
+        Return the best (movie_id, fused score) pairs, leaving out rated movies.
+        """
+        rows, ratings = self.profile_rows(my_ratings)
+        content = self.content_query(rows, ratings)
+        collaborative = self.collaborative_query(rows, ratings)
+        if self.client is not None:
+            return self.search(my_ratings, content, collaborative, top_k)
+
+        rankings = []
+        if content is not None:
+            rankings.append(self.top_rows(self.embeddings @ content, rows))
+        if collaborative is not None:
+            users = self.raters[:, collaborative.indices]
+            scores = users @ np.asarray(collaborative.values, dtype=np.float32)
+            # A sparse search only finds movies sharing a rater with the query.
+            scores[np.diff(users.tocsr().indptr) == 0] = -np.inf
+            rankings.append(self.top_rows(scores, rows))
+        fused_rows, fused_scores = reciprocal_rank_fusion(rankings)
+        return list(zip(self.movie_ids[fused_rows[:top_k]].tolist(), fused_scores[:top_k].tolist()))
+
+    def top_rows(self, scores: np.ndarray, rated_rows: np.ndarray) -> np.ndarray:
+        """
+        The rows of the `prefetch_limit` best scores, best first, leaving out rated rows.
+        """
+        scores = scores.copy()
+        scores[rated_rows] = -np.inf
+        k = min(self.prefetch_limit, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return best[np.isfinite(scores[best])]
+
+    def search(
+            self,
+            my_ratings: Dict[int, float],
+            content: Optional[np.ndarray],
+            collaborative: Optional[models.SparseVector],
+            top_k: int
+    ) -> List[Tuple[int, float]]:
+        """
+        Fuse both retrievers on the Qdrant collection in a single query-API request.
+        """
+        not_rated = models.Filter(must_not=[models.HasIdCondition(has_id=[int(movie_id) for movie_id in my_ratings])])
+        prefetch = []
+        if content is not None:
+            prefetch.append(models.Prefetch(
+                query=content.tolist(), using="content", filter=not_rated, limit=self.prefetch_limit
+            ))
+        if collaborative is not None:
+            prefetch.append(models.Prefetch(
+                query=collaborative, using="raters", filter=not_rated, limit=self.prefetch_limit
+            ))
+        if not prefetch:
+            return []
+        response = self.client.query_points(
+            collection_name=self.collection_name,
+            prefetch=prefetch,
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=top_k
+        )
+        return [(int(point.id), point.score) for point in response.points]
+
+    def recommend(
+            self,
+            my_ratings: Dict[int, float],
+            movies_df: pd.DataFrame,
+            top_k: int
+    ) -> List[Tuple[str, float, int]]:
+        """
+        Generate top-k movie recommendations based on user's ratings.
+        """
+        if self.movie_index is None:
+            self.movie_index = dict(zip(movies_df["movieId"].astype(int), movies_df["title"]))
+        return [
+            (self.movie_index[movie_id], score, movie_id)
+            for movie_id, score in self.top_movies(my_ratings, top_k)
+            if movie_id in self.movie_index
+        ]
@@ -0,0 +1,124 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import os
+import shutil
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .vectors import SparseVectors
+
+ITEM_NEIGHBOURS = 50
+ITEM_BLOCK_SIZE = 512  # Movies scored per sparse matrix product
+
+# Normalized movie x user matrix, set in each worker process by init_worker.
+_items: Optional[csr_matrix] = None
+
+
+@dataclass
+class ItemIndex:
+    """
+    Top-N most similar movies of every movie, row i belonging to ``movie_ids[i]`` (sorted).
+    Rows are ordered by decreasing cosine similarity; missing neighbours are padded with id -1.
+    """
+    movie_ids: np.ndarray
+    neighbour_ids: np.ndarray
+    neighbour_scores: np.ndarray
+
+    def similar(self, movie_id: int, k: int) -> List[Tuple[int, float]]:
+        """
+        Return up to k (movie_id, cosine similarity) pairs for `movie_id`, or nothing for unknown movies.
+        """
+        row = np.searchsorted(self.movie_ids, movie_id)
+        if row == len(self.movie_ids) or self.movie_ids[row] != movie_id:
+            return []
+        ids, scores = self.neighbour_ids[row, :k], self.neighbour_scores[row, :k]
+        return [(movie, score) for movie, score in zip(ids.tolist(), scores.tolist()) if movie >= 0]
+
+
+def item_matrix(sparse_vectors: SparseVectors) -> Tuple[np.ndarray, csr_matrix]:
+    """
+    Build the movie x user rating matrix with L2-normalized rows, so row dot products are cosines.
+    """
+    movie_ids, movie_rows = np.unique(sparse_vectors.indices, return_inverse=True)
+    user_columns = np.repeat(np.arange(len(sparse_vectors)), np.diff(sparse_vectors.offsets))
+    items = csr_matrix(
+        (sparse_vectors.values.astype(np.float32), (movie_rows, user_columns)),
+        shape=(len(movie_ids), len(sparse_vectors))
+    )
+    norms = np.sqrt(np.asarray(items.multiply(items).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    items = csr_matrix(items.multiply(1 / norms[:, None]), dtype=np.float32)
+    return movie_ids, items
+
+
+def init_worker(items: csr_matrix) -> None:
+    global _items
+    _items = items
+
+
+def top_neighbours_block(start: int, end: int, n_neighbours: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score movies [start, end) against every movie and keep the best `n_neighbours` rows of each.
+    """
+    scores = (_items[start:end] @ _items.T).toarray()
+    scores[np.arange(end - start), np.arange(start, end)] = -np.inf  # A movie is not its own neighbour
+    scores[scores == 0] = -np.inf  # Movies without a common user are not neighbours either
+
+    n = min(n_neighbours, scores.shape[1])
+    best = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def build_item_index(
+        sparse_vectors: SparseVectors,
+        n_neighbours: int = ITEM_NEIGHBOURS,
+        block_size: int = ITEM_BLOCK_SIZE,
+        workers: Optional[int] = None
+) -> ItemIndex:
+    """
+    Compute the top cosine neighbours of every movie, scoring blocks of movies across a process pool.
+    """
+    movie_ids, items = item_matrix(sparse_vectors)
+    n_movies = len(movie_ids)
+    neighbour_ids = np.full((n_movies, n_neighbours), -1, dtype=np.int32)
+    neighbour_scores = np.zeros((n_movies, n_neighbours), dtype=np.float32)
+
+    blocks = [(start, min(start + block_size, n_movies)) for start in range(0, n_movies, block_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(items,)) as pool:
+        futures = [pool.submit(top_neighbours_block, start, end, n_neighbours) for start, end in blocks]
+        for (start, end), future in zip(blocks, futures):
+            rows, scores = future.result()
+            found = np.isfinite(scores)
+            width = rows.shape[1]
+            neighbour_ids[start:end, :width] = np.where(found, movie_ids[rows], -1)
+            neighbour_scores[start:end, :width] = np.where(found, scores, 0)
+
+    return ItemIndex(movie_ids=movie_ids, neighbour_ids=neighbour_ids, neighbour_scores=neighbour_scores)
+
+
+def save_item_index(index: ItemIndex, index_dir: str) -> None:
+    """
+    Write the index as .npy files, replacing any previous index at `index_dir`.
+    """
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent)
+    for name in ("movie_ids", "neighbour_ids", "neighbour_scores"):
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(index, name))
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.replace(tmp_dir, index_dir)
+
+
+def load_item_index(index_dir: str) -> ItemIndex:
+    """
+    Memory-map an index written by `save_item_index`.
+    """
+    return ItemIndex(**{
+        name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+        for name in ("movie_ids", "neighbour_ids", "neighbour_scores")
+    })
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+import importlib.util
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+# pyarrow parses CSVs on several threads without holding the GIL, the C engine is the fallback.
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") is not None else "c"
+MOVIES_DTYPES = {"movieId": np.int64, "title": str, "genres": str}
+RATINGS_DTYPES = {"userId": np.int32, "movieId": np.int32, "rating": np.float32, "timestamp": np.int64}
+
+
+def read_csv(path: str, dtypes: Dict, engine: str = CSV_ENGINE) -> pd.DataFrame:
+    """
+    Read the `dtypes` columns of a CSV with explicit types, so no column is type-inferred.
+    """
+    return pd.read_csv(path, usecols=list(dtypes), dtype=dtypes, engine=engine)
+
+
+def read_movies_and_ratings(
+        movies_csv: str,
+        ratings_csv: str,
+        engine: str = CSV_ENGINE
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Read both CSVs at the same time, the parsers release the GIL so the reads overlap.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        movies = pool.submit(read_csv, movies_csv, MOVIES_DTYPES, engine)
+        ratings = pool.submit(read_csv, ratings_csv, RATINGS_DTYPES, engine)
+        return movies.result(), ratings.result()
+
+
+def parse_years(titles: pd.Series) -> pd.Series:
+    """
+    Release year of each title, as float with NaN when there is none.
+
+    MovieLens titles end with "(YYYY)", so the year is read by slicing the last six characters.
+    Titles that do not end that way fall back to the first "(YYYY)" anywhere in the title.
+    """
+    titles = titles.astype(str).str.strip()
+    has_suffix = titles.str[-6:-5].eq("(") & titles.str[-1:].eq(")")
+    years = pd.to_numeric(titles.str[-5:-1].where(has_suffix), errors="coerce")
+
+    missing = years.isna()
+    if missing.any():
+        years[missing] = pd.to_numeric(
+            titles[missing].str.extract(r"\((\d{4})\)", expand=False),
+            errors="coerce"
+        )
+    return years
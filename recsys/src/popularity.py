@@ -0,0 +1,141 @@
+from dataclasses import dataclass, field
+from typing import Callable, Container, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+TRENDING_HALF_LIFE_DAYS = 90.0
+RANKINGS = ("popular", "trending")
+SELECT_CHUNK = 64  # Ranked movies checked per step when a filter rejects some
+
+
+@dataclass
+class PopularityTable:
+    """
+    Per-movie rating counts and recency-weighted "trending" counts, with both rankings precomputed.
+
+    A rating made `age` seconds before `reference` adds 0.5 ** (age / half_life) to the trending
+    count of its movie. Counts are kept relative to `reference`, so new ratings are merged in
+    without rescanning old ones.
+    """
+    movie_ids: np.ndarray
+    counts: np.ndarray
+    trending: np.ndarray
+    reference: int
+    half_life_seconds: float = TRENDING_HALF_LIFE_DAYS * 86400
+    orders: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def empty(cls, half_life_days: float = TRENDING_HALF_LIFE_DAYS) -> "PopularityTable":
+        return cls(
+            movie_ids=np.empty(0, dtype=np.int64),
+            counts=np.empty(0),
+            trending=np.empty(0),
+            reference=0,
+            half_life_seconds=half_life_days * 86400
+        )
+
+    @classmethod
+    def from_ratings(
+            cls,
+            ratings_df: pd.DataFrame,
+            half_life_days: float = TRENDING_HALF_LIFE_DAYS
+    ) -> "PopularityTable":
+        """
+        Build the table from raw rating rows with movieId and timestamp columns.
+        """
+        table = cls.empty(half_life_days)
+        table.update(ratings_df)
+        return table
+
+    def update(self, ratings_df: pd.DataFrame) -> None:
+        """
+        Add rating rows to the counts, moving the reference forward to the newest rating.
+        """
+        if ratings_df.empty:
+            return
+        timestamps = ratings_df["timestamp"].to_numpy(dtype=np.int64)
+        reference = max(self.reference, int(timestamps.max()))
+        decay = 0.5 ** ((reference - self.reference) / self.half_life_seconds)
+        weights = 0.5 ** ((reference - timestamps) / self.half_life_seconds)
+
+        new_ids, columns = np.unique(ratings_df["movieId"].to_numpy(dtype=np.int64), return_inverse=True)
+        movie_ids = np.union1d(self.movie_ids, new_ids)
+        counts = np.zeros(len(movie_ids))
+        trending = np.zeros(len(movie_ids))
+        old_rows = np.searchsorted(movie_ids, self.movie_ids)
+        counts[old_rows] = self.counts
+        trending[old_rows] = self.trending * decay
+        new_rows = np.searchsorted(movie_ids, new_ids)
+        counts[new_rows] += np.bincount(columns, minlength=len(new_ids))
+        trending[new_rows] += np.bincount(columns, weights=weights, minlength=len(new_ids))
+
+        self.movie_ids, self.counts, self.trending, self.reference = movie_ids, counts, trending, reference
+        self.rank()
+
+    def rank(self) -> None:
+        """
+        Precompute the movie order of every ranking, best first.
+        """
+        self.orders = {ranking: np.argsort(-self.scores(ranking), kind="stable") for ranking in RANKINGS}
+
+    def scores(self, ranking: str) -> np.ndarray:
+        if ranking not in RANKINGS:
+            raise ValueError(f"Unknown ranking {ranking!r}, expected one of {RANKINGS}")
+        return self.counts if ranking == "popular" else self.trending
+
+    def top(
+            self,
+            k: int,
+            ranking: str = "trending",
+            exclude: Container[int] = (),
+            accept: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        The k best (movie_id, score) pairs of a ranking, skipping `exclude` and movies `accept` rejects.
+
+        Walks the precomputed order, so the cost grows with k and the number of skipped movies only.
+        """
+        scores, order = self.scores(ranking), self.orders.get(ranking, np.empty(0, dtype=np.int64))
+        top_movies: List[Tuple[int, float]] = []
+        if k <= 0:
+            return top_movies
+        for start in range(0, len(order), max(SELECT_CHUNK, k)):
+            rows = order[start:start + max(SELECT_CHUNK, k)]
+            if accept is not None:
+                rows = rows[accept(self.movie_ids[rows])]
+            for movie_id, score in zip(self.movie_ids[rows].tolist(), scores[rows].tolist()):
+                if movie_id not in exclude:
+                    top_movies.append((movie_id, score))
+                    if len(top_movies) == k:
+                        return top_movies
+        return top_movies
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "movie_ids": self.movie_ids,
+            "counts": self.counts,
+            "trending": self.trending,
+            "reference": np.int64(self.reference),
+            "half_life_seconds": np.float64(self.half_life_seconds)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "PopularityTable":
+        table = cls(
+            movie_ids=np.asarray(arrays["movie_ids"]),
+            counts=np.asarray(arrays["counts"]),
+            trending=np.asarray(arrays["trending"]),
+            reference=int(arrays["reference"]),
+            half_life_seconds=float(arrays["half_life_seconds"])
+        )
+        table.rank()
+        return table
+
+    def save(self, path: str) -> None:
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path: str) -> "PopularityTable":
+        with np.load(path) as saved:
+            return cls.from_arrays(saved)
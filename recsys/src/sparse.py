@@ -1,85 +1,430 @@
-from collections import defaultdict
+from contextlib import contextmanager
+import json
 import os
+import time
+import numpy as np
 import pandas as pd
 from qdrant_client import QdrantClient, models
-from qdrant_client.http.models import PointStruct, SparseVector, NamedSparseVector
-from typing import List, Tuple, Dict, Generator
+from qdrant_client.http.models import SparseVector
+from scipy.sparse import csr_matrix
+from typing import Callable, List, Tuple, Dict, Hashable, Iterable, Iterator, NamedTuple, Optional
+
+from .artifacts import artifact_key, load_artifacts, save_artifacts
+from .backends import COLLECTION_NAME, QdrantBackend, SearchBackend, UploadReport
+from .cache import ResultCache, profile_key
+from .filters import MovieCatalog, MovieFilter
+from .popularity import PopularityTable
+from .loading import CSV_ENGINE, MOVIES_DTYPES, RATINGS_DTYPES, parse_years, read_csv, read_movies_and_ratings
+from .item_index import ITEM_NEIGHBOURS, ItemIndex, build_item_index, load_item_index, save_item_index
+from .vectors import SparseVectors
 
 
 DATA_DIR = "data"
 MOVIES_CSV = os.path.join(DATA_DIR, "movies.csv")
 RATINGS_CSV = os.path.join(DATA_DIR, "ratings.csv")
+INGEST_STATE_JSON = os.path.join(DATA_DIR, "ingest_state.json")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+ITEM_INDEX_DIR = os.path.join(DATA_DIR, "item_index")
 QDRANT_URL = "http://localhost:6333"
-COLLECTION_NAME = "movies"
+NEIGHBOURS_LIMIT = 20
+# How a neighbour's similarity counts towards the movies it rated; works on floats and NumPy arrays.
+NEIGHBOUR_WEIGHTINGS: Dict[str, Callable] = {
+    "linear": lambda similarity: similarity,
+    "squared": lambda similarity: similarity * abs(similarity),  # Favours the closest neighbours
+    "uniform": lambda similarity: np.ones_like(similarity, dtype=np.float64),  # Counts neighbours
+}
+BATCH_SIZE = 256  # Profiles scored per backend batch search in recommend_batch.
+COLD_START_THRESHOLD = 3  # Profiles with fewer ratings get the trending movies instead of a neighbour search.
+CHUNK_SIZE = 1_000_000  # Rating rows read per chunk by ingest_streaming.
+
+
+class MovieInfo(NamedTuple):
+    title: str
+    year: int
+    genres: str
+
+
+class RecommendOptions(NamedTuple):
+    """
+    The search and scoring parameters of one `recommend` or `recommend_batch` call.
+    """
+    neighbours: int = NEIGHBOURS_LIMIT
+    min_similarity: Optional[float] = None
+    weighting: str = "linear"
+    scoring: str = "presence"
+    filters: Optional[MovieFilter] = None
+
 
 class Recommender:
     """
     A movie recommender system using sparse vectors and Qdrant for vector search.
     """
 
-    def __init__(self, qdrant_url: str = QDRANT_URL):
+    def __init__(
+            self,
+            qdrant_url: str = QDRANT_URL,
+            backend: Optional[SearchBackend] = None,
+            cache: Optional[ResultCache] = None,
+            cold_start_threshold: int = COLD_START_THRESHOLD,
+            cold_start_ranking: str = "trending"
+    ):
         """
-        Initialize the Qdrant client.
+        Initialize the search backend, a Qdrant client at `qdrant_url` unless a backend is given,
+        and the recommendation cache, `ResultCache(max_entries=0)` turns caching off.
+        Profiles with fewer than `cold_start_threshold` ratings are served from the `cold_start_ranking`
+        ("trending" or "popular") of the popularity table.
         """
-        self.client = QdrantClient(url=qdrant_url)
+        self.backend = backend if backend is not None else QdrantBackend(QdrantClient(url=qdrant_url))
+        self.cache = cache if cache is not None else ResultCache()
+        self.cold_start_threshold = cold_start_threshold
+        self.cold_start_ranking = cold_start_ranking
+        self.popularity: Optional[PopularityTable] = None  # Built from the ratings during ingest
+        self.movie_index: Optional[Dict[int, MovieInfo]] = None
+        self.catalog: Optional[MovieCatalog] = None  # Year and genre arrays for filtered recommendations
+        self.normalization: Optional[Tuple[float, float]] = None  # (mean, std) used to normalize ratings
+        self.start_year: Optional[int] = None
+        self.watermark: Optional[int] = None  # Latest rating timestamp ingested
+        self.item_index: Optional[ItemIndex] = None
+        self.stage_seconds: Dict[str, float] = {}  # Wall time of the latest run of each ingest stage
 
-    def load_and_filter_data(self, start_year: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    @contextmanager
+    def timed_stage(self, name: str):
         """
-        Load movies and ratings, and filter movies by a start year.
+        Record the wall time of the enclosed block in `stage_seconds[name]`.
         """
-        movies_df = pd.read_csv(MOVIES_CSV, low_memory=False)
-        ratings_df = pd.read_csv(RATINGS_CSV, low_memory=False)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[name] = time.perf_counter() - start
 
-        movies_df['year'] = pd.to_numeric(
-            movies_df['title'].str.extract(r'\((\d{4})\)', expand=False),
-            errors='coerce'
-        )
-        movies_df = movies_df.dropna(subset=['year']).copy()
-        movies_df['year'] = movies_df['year'].astype(int)
-        filtered_movies = movies_df[movies_df['year'] >= start_year].copy()
+    def load_and_filter_data(
+            self,
+            start_year: int,
+            ratings_csv: str = RATINGS_CSV,
+            engine: str = CSV_ENGINE
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Load movies and ratings, filter movies by a start year and index the remaining movies by id.
+
+        Both CSVs are read concurrently with explicit dtypes, by default with the pyarrow engine.
+        """
+        with self.timed_stage("read_csv"):
+            movies_df, ratings_df = read_movies_and_ratings(MOVIES_CSV, ratings_csv, engine)
+        filtered_movies = self.filter_movies(movies_df, start_year)
 
-        valid_movie_ids = filtered_movies['movieId'].unique()
-        filtered_ratings = ratings_df[ratings_df['movieId'].isin(valid_movie_ids)].copy()
+        with self.timed_stage("filter_ratings"):
+            valid_movie_ids = filtered_movies['movieId'].unique()
+            filtered_ratings = ratings_df[ratings_df['movieId'].isin(valid_movie_ids)].copy()
+            self.watermark = int(ratings_df['timestamp'].max())
 
+        with self.timed_stage("popularity"):
+            self.popularity = PopularityTable.from_ratings(filtered_ratings)
         return filtered_movies, filtered_ratings
 
+    def load_movies(self, start_year: int, engine: str = CSV_ENGINE) -> pd.DataFrame:
+        """
+        Load movies released from `start_year` on and index them by id.
+        """
+        with self.timed_stage("read_csv"):
+            movies_df = read_csv(MOVIES_CSV, MOVIES_DTYPES, engine)
+        return self.filter_movies(movies_df, start_year)
+
+    def filter_movies(self, movies_df: pd.DataFrame, start_year: int) -> pd.DataFrame:
+        """
+        Parse release years from the titles, keep movies released from `start_year` on and index them by id.
+        """
+        with self.timed_stage("parse_years"):
+            movies_df['year'] = parse_years(movies_df['title'])
+            movies_df = movies_df.dropna(subset=['year']).copy()
+            movies_df['year'] = movies_df['year'].astype(int)
+            filtered_movies = movies_df[movies_df['year'] >= start_year].copy()
+
+        with self.timed_stage("index_movies"):
+            self.start_year = start_year
+            self.index_movies(filtered_movies)
+        return filtered_movies
+
+    def load_prepared(
+            self,
+            start_year: int,
+            ratings_csv: str = RATINGS_CSV,
+            cache_dir: str = CACHE_DIR
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Return the filtered movies and aggregated ratings, as `load_and_filter_data` followed by
+        `prepare_ratings_data` would, from a memory-mapped cache when one matches the inputs.
+
+        The cache is keyed by the hashes of both CSVs, `start_year` and the artifact format version,
+        so changed inputs and caches written by older versions miss it.
+        """
+        with self.timed_stage("load_artifacts"):
+            artifact_dir = os.path.join(cache_dir, artifact_key([MOVIES_CSV, ratings_csv], start_year))
+            cached = load_artifacts(artifact_dir)
+        if cached is not None:
+            movies_df, agg_ratings_df, meta, arrays = cached
+            self.start_year = start_year
+            self.index_movies(movies_df)
+            self.normalization = (meta["mean"], meta["std"])
+            self.watermark = meta["watermark"]
+            self.popularity = PopularityTable.from_arrays(arrays)
+            return movies_df, agg_ratings_df
+
+        movies_df, ratings_df = self.load_and_filter_data(start_year, ratings_csv)
+        agg_ratings_df = self.prepare_ratings_data(movies_df, ratings_df)
+        mean, std = self.normalization
+        save_artifacts(artifact_dir, movies_df, agg_ratings_df, {
+            "mean": mean,
+            "std": std,
+            "watermark": self.watermark
+        }, self.popularity.to_arrays())
+        return movies_df, agg_ratings_df
+
+    def index_movies(self, movies_df: pd.DataFrame) -> None:
+        """
+        Build the movie index and the catalog used for filtering, and hand the catalog to the backend
+        so uploaded users carry the years and genres of the movies they rated.
+        """
+        self.movie_index = self.build_movie_index(movies_df)
+        self.catalog = MovieCatalog.from_movies(movies_df)
+        self.backend.set_catalog(self.catalog)
+
+    def build_movie_index(self, movies_df: pd.DataFrame) -> Dict[int, MovieInfo]:
+        """
+        Map every movie id to its title, year and genres.
+        """
+        return {
+            int(movie_id): MovieInfo(title, int(year), genres)
+            for movie_id, title, year, genres in zip(
+                movies_df["movieId"], movies_df["title"], movies_df["year"], movies_df["genres"]
+            )
+        }
+
     def prepare_ratings_data(self, movies_df: pd.DataFrame, ratings_df: pd.DataFrame) -> pd.DataFrame:
         """
         Normalize and merge ratings with movies metadata.
         """
-        ratings_df['movieId'] = ratings_df['movieId'].astype(str)
-        movies_df['movieId'] = movies_df['movieId'].astype(str)
+        with self.timed_stage("prepare"):
+            ratings = ratings_df['rating'].astype(np.float64)
+            self.normalization = (float(ratings.mean()), float(ratings.std()))
+            mean, std = self.normalization
+            ratings_df['rating'] = (ratings - mean) / std
+
+            merged_df = ratings_df.merge(
+                movies_df[['movieId', 'title']],
+                on='movieId',
+                how='inner'
+            )
+
+            return merged_df.groupby(['userId', 'movieId'])['rating'].mean().reset_index()
+
+    def read_rating_chunks(
+            self,
+            valid_movie_ids: np.ndarray,
+            ratings_csv: str = RATINGS_CSV,
+            chunk_size: int = CHUNK_SIZE
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Read ratings in chunks with narrow dtypes, keeping only ratings of `valid_movie_ids`.
+        """
+        for chunk in pd.read_csv(ratings_csv, usecols=list(RATINGS_DTYPES), dtype=RATINGS_DTYPES, chunksize=chunk_size):
+            yield chunk[chunk["movieId"].isin(valid_movie_ids)]
+
+    def rating_statistics(self, chunks: Iterable[pd.DataFrame]) -> Tuple[float, float]:
+        """
+        Mean and sample standard deviation of the ratings, merged chunk by chunk.
+        """
+        count, mean, m2 = 0, 0.0, 0.0
+        for chunk in chunks:
+            ratings = chunk["rating"].to_numpy(dtype=np.float64)
+            if len(ratings) == 0:
+                continue
+            chunk_mean = ratings.mean()
+            chunk_m2 = ((ratings - chunk_mean) ** 2).sum()
+            total = count + len(ratings)
+            delta = chunk_mean - mean
+            mean += delta * len(ratings) / total
+            m2 += chunk_m2 + delta ** 2 * count * len(ratings) / total
+            count = total
+        if count < 2:
+            raise ValueError("At least two ratings are needed to normalize ratings")
+        return float(mean), float(np.sqrt(m2 / (count - 1)))
+
+    def ingest_streaming(
+            self,
+            start_year: int,
+            ratings_csv: str = RATINGS_CSV,
+            chunk_size: int = CHUNK_SIZE,
+            delete_existing: bool = True
+    ) -> pd.DataFrame:
+        """
+        Load ratings in chunks and upload each user's vector as soon as all of their ratings are read.
 
-        ratings_df['rating'] = (ratings_df['rating'] - ratings_df['rating'].mean()) / ratings_df['rating'].std()
+        The collection is set up first, recreated unless `delete_existing` is False.
+        A first pass computes the normalization statistics, the second normalizes and uploads.
+        Ratings must be sorted by userId, as they are in the MovieLens dumps.
+        Returns the filtered movies, as `load_and_filter_data` does.
+        """
+        self.setup_collection(delete_existing)
+        movies_df = self.load_movies(start_year)
+        valid_movie_ids = movies_df["movieId"].unique()
 
-        merged_df = ratings_df.merge(
-            movies_df[['movieId', 'title']],
-            on='movieId',
-            how='inner'
+        self.normalization = self.rating_statistics(
+            self.read_rating_chunks(valid_movie_ids, ratings_csv, chunk_size)
         )
 
-        return merged_df.groupby(['userId', 'movieId'])['rating'].mean().reset_index()
+        self.popularity = PopularityTable.empty()
+        pending, last_user = None, -1
+        for chunk in self.read_rating_chunks(valid_movie_ids, ratings_csv, chunk_size):
+            if chunk.empty:
+                continue
+            users = chunk["userId"].to_numpy()
+            if users[0] < last_user or np.any(users[1:] < users[:-1]):
+                raise ValueError(f"{ratings_csv} must be sorted by userId for streaming ingest")
+            if pending is not None:
+                chunk = pd.concat([pending, chunk], ignore_index=True)
 
-    def convert_to_sparse_vectors(self, agg_data: pd.DataFrame) -> Dict[int, Dict[str, List[float]]]:
+            # The last user of a chunk may continue in the next one, everyone before it is complete.
+            last_user = users[-1]
+            complete = chunk["userId"].to_numpy() < last_user
+            self.upload_ratings(chunk[complete])
+            self.popularity.update(chunk[complete])
+            pending = chunk[~complete]
+            self.watermark = max(self.watermark or 0, int(chunk["timestamp"].max()))
+
+        if pending is not None:
+            self.upload_ratings(pending)
+            self.popularity.update(pending)
+        return movies_df
+
+    def upload_ratings(self, ratings_df: pd.DataFrame) -> None:
         """
-        Convert user ratings into sparse vectors.
+        Normalize raw ratings with the stored statistics, aggregate them per user and upload the vectors.
         """
-        sparse_vectors = defaultdict(lambda: {"values": [], "indices": []})
-        for row in agg_data.itertuples():
-            sparse_vectors[row.userId]["indices"].append(int(row.movieId))
-            sparse_vectors[row.userId]["values"].append(row.rating)
-        return sparse_vectors
+        if ratings_df.empty:
+            return
+        self.upload_data(self.convert_to_sparse_vectors(self.aggregate_ratings(ratings_df)))
 
-    def generate_points(self, sparse_vectors) -> Generator[PointStruct, None, None]:
+    def aggregate_ratings(self, ratings_df: pd.DataFrame) -> pd.DataFrame:
         """
-        Generate Qdrant PointStruct objects for each user.
+        Normalize raw ratings with the stored statistics and average them per user and movie,
+        as `prepare_ratings_data` does without recomputing the statistics.
         """
-        for user_id, vec in sparse_vectors.items():
-            yield PointStruct(
-                id=user_id,
-                vector={"ratings": SparseVector(indices=vec["indices"], values=vec["values"])},
-                payload={"user_id": user_id, "movie_id": vec["indices"]}
-            )
+        mean, std = self.normalization
+        normalized = ratings_df.assign(rating=(ratings_df["rating"] - mean) / std)
+        return normalized.groupby(["userId", "movieId"])["rating"].mean().reset_index()
+
+    def update_ratings(self, new_ratings: pd.DataFrame) -> int:
+        """
+        Fold new rating rows into the stored vectors of the users who made them, and return how many users changed.
+
+        Only affected users are re-uploaded: their stored vector is fetched, a new rating of a movie
+        replaces the previous one, and the merged vector is upserted. New ratings are normalized with
+        the statistics of the last full ingest, which stay fixed until the next full rebuild.
+        Ratings of movies the user had not rated before are also counted in the popularity table.
+        """
+        if self.normalization is None:
+            raise ValueError("No normalization statistics, run a full ingest or load_ingest_state first")
+        new_ratings = new_ratings[new_ratings["movieId"].isin(list(self.movie_index))]
+        if new_ratings.empty:
+            return 0
+
+        mean, std = self.normalization
+        latest = new_ratings.sort_values("timestamp").drop_duplicates(["userId", "movieId"], keep="last")
+        latest = latest.assign(rating=(latest["rating"] - mean) / std)
+
+        user_ids = latest["userId"].unique().tolist()
+        stored = self.backend.retrieve(user_ids)
+        stored_rows = pd.DataFrame({
+            "userId": np.repeat(stored.user_ids, np.diff(stored.offsets)),
+            "movieId": stored.indices,
+            "rating": stored.values
+        })
+        merged = pd.concat([stored_rows, latest[["userId", "movieId", "rating"]]], ignore_index=True)
+        merged = merged.drop_duplicates(["userId", "movieId"], keep="last")
+
+        self.upload_data(self.convert_to_sparse_vectors(merged))
+        if self.popularity is not None:
+            # Stored pairs were counted by an earlier ingest or sync, a re-rating does not count again.
+            first = new_ratings.sort_values("timestamp").drop_duplicates(["userId", "movieId"])
+            pairs = pd.MultiIndex.from_frame(first[["userId", "movieId"]].astype(np.int64))
+            self.popularity.update(first[~pairs.isin(pd.MultiIndex.from_frame(stored_rows[["userId", "movieId"]]))])
+        self.watermark = max(self.watermark or 0, int(new_ratings["timestamp"].max()))
+        return len(user_ids)
+
+    def sync_ratings(
+            self,
+            ratings_csv: str = RATINGS_CSV,
+            state_path: str = INGEST_STATE_JSON,
+            chunk_size: int = CHUNK_SIZE
+    ) -> Tuple[pd.DataFrame, int]:
+        """
+        Upsert the users who rated something after the persisted watermark, then advance it.
+
+        Returns the filtered movies, as `load_and_filter_data` does, and the number of updated users.
+        """
+        self.load_ingest_state(state_path)
+        movies_df = self.load_movies(self.start_year)
+
+        # Rows at the watermark itself are re-read, upserting them again is harmless.
+        new_ratings = [
+            chunk[chunk["timestamp"] >= self.watermark]
+            for chunk in self.read_rating_chunks(movies_df["movieId"].unique(), ratings_csv, chunk_size)
+        ]
+        updated = self.update_ratings(pd.concat(new_ratings, ignore_index=True)) if new_ratings else 0
+
+        self.save_ingest_state(state_path)
+        return movies_df, updated
+
+    def save_ingest_state(self, state_path: str = INGEST_STATE_JSON) -> None:
+        """
+        Persist the watermark, year filter and normalization statistics for later incremental syncs,
+        and the popularity table next to them.
+        """
+        mean, std = self.normalization
+        with open(state_path, "w") as state_file:
+            json.dump({
+                "watermark": self.watermark,
+                "start_year": self.start_year,
+                "mean": mean,
+                "std": std
+            }, state_file)
+        if self.popularity is not None:
+            self.popularity.save(self.popularity_path(state_path))
+
+    def load_ingest_state(self, state_path: str = INGEST_STATE_JSON) -> None:
+        """
+        Restore the state written by `save_ingest_state`.
+        """
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+        self.watermark = state["watermark"]
+        self.start_year = state["start_year"]
+        self.normalization = (state["mean"], state["std"])
+        if os.path.exists(self.popularity_path(state_path)):
+            self.popularity = PopularityTable.load(self.popularity_path(state_path))
+
+    @staticmethod
+    def popularity_path(state_path: str) -> str:
+        return os.path.splitext(state_path)[0] + "_popularity.npz"
+
+    def convert_to_sparse_vectors(self, agg_data: pd.DataFrame) -> SparseVectors:
+        """
+        Convert user ratings into sparse vectors, grouped per user as contiguous CSR arrays.
+        """
+        with self.timed_stage("convert"):
+            user_ids = agg_data["userId"].to_numpy(dtype=np.int64)
+            movie_ids = agg_data["movieId"].to_numpy().astype(np.int64)
+            ratings = agg_data["rating"].to_numpy(dtype=np.float64)
+
+            order = np.lexsort((movie_ids, user_ids))
+            user_ids, movie_ids, ratings = user_ids[order], movie_ids[order], ratings[order]
+
+            unique_users, counts = np.unique(user_ids, return_counts=True)
+            offsets = np.zeros(len(unique_users) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+
+            return SparseVectors(user_ids=unique_users, offsets=offsets, indices=movie_ids, values=ratings)
 
     def to_sparse_vector(self, ratings: Dict[int, float]) -> SparseVector:
         """
@@ -90,64 +435,366 @@ class Recommender:
             values=list(ratings.values())
         )
 
-    def get_unique_movie_scores(
-            self,
-            previous_ratings: Dict[int, float],
-            results: List[models.ScoredPoint]
-    ) -> Dict[int, float]:
-        """
-        Score movies not already rated by user.
-        """
-        movie_scores = defaultdict(float)
-        for result in results:
-            for movie_id in result.payload["movie_id"]:
-                if movie_id not in previous_ratings:
-                    movie_scores[movie_id] += result.score
-        return movie_scores
-
     def setup_collection(self, delete_existing: bool = True) -> None:
         """
-        Create or reset the Qdrant collection for storing sparse vectors.
+        Create or reset the backend storage for user sparse vectors.
         """
-        if delete_existing and self.client.collection_exists(COLLECTION_NAME):
-            self.client.delete_collection(COLLECTION_NAME)
-        self.client.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config={},
-            sparse_vectors_config={"ratings": models.SparseVectorParams()}
-        )
+        self.backend.setup(delete_existing)
+        self.cache.clear()
 
-    def upload_data(self, sparse_vectors: Dict[int, Dict[str, List[float]]]) -> None:
+    def upload_data(self, sparse_vectors: SparseVectors) -> UploadReport:
         """
-        Upload sparse vectors to Qdrant collection.
+        Upload sparse vectors to the search backend and return the upload throughput.
+
+        Cached recommendations are dropped, as the new vectors may change anyone's neighbours.
         """
-        self.client.upload_points(
-            collection_name=COLLECTION_NAME,
-            points=self.generate_points(sparse_vectors)
-        )
+        with self.timed_stage("upload"):
+            report = self.backend.upload(sparse_vectors)
+        self.cache.clear()
+        return report
 
     def recommend(
             self,
             my_ratings: Dict[int, float],
             movies_df: pd.DataFrame,
-            top_k: int
+            top_k: int,
+            neighbours: int = NEIGHBOURS_LIMIT,
+            min_similarity: Optional[float] = None,
+            weighting: str = "linear",
+            scoring: str = "presence",
+            filters: Optional[MovieFilter] = None
     ) -> List[Tuple[str, float, int]]:
         """
         Generate top-k movie recommendations based on user's ratings.
+
+        Scores come from the `neighbours` most similar users with a similarity of at least
+        `min_similarity`, weighted with one of NEIGHBOUR_WEIGHTINGS. With `scoring="presence"` a neighbour
+        adds its weight to every movie it rated, with `scoring="rating"` the weight is multiplied by
+        the neighbour's normalized rating, so movies it disliked are pushed down.
+
+        `filters` restricts the recommended movies by year range, genres and an exclude list. The
+        neighbour search itself is filtered on the indexed "years" and "genres" payload, so the
+        neighbours are users who rated matching movies, and the neighbours' movies that do not match
+        are dropped before scoring, so up to `top_k` matching movies are returned.
+        Titles come from the index built by `load_and_filter_data`, or from `movies_df` when there is none.
+        Results are cached per profile and parameters until the collection changes.
+
+        Profiles with fewer than `cold_start_threshold` ratings, and searches that find no candidate,
+        are answered from the popularity table instead.
+        """
+        options = RecommendOptions(neighbours, min_similarity, weighting, scoring, filters)
+        profiles = {None: my_ratings}
+        recommendations, cache_keys = self.answer_without_search(profiles, movies_df, top_k, options)
+        if cache_keys:
+            results = self.backend.search(self.to_sparse_vector(my_ratings), **self.search_arguments(options))
+            recommendations.update(
+                self.recommend_from_results([results], [None], profiles, movies_df, top_k, options, cache_keys)
+            )
+        return recommendations[None]
+
+    def is_cold_start(self, my_ratings: Dict[int, float]) -> bool:
+        """
+        Whether a profile is too small for a useful neighbour search and a popularity table can answer it.
+        """
+        return self.popularity is not None and len(my_ratings) < self.cold_start_threshold
+
+    def popular_movies(
+            self,
+            top_k: int,
+            my_ratings: Optional[Dict[int, float]] = None,
+            movies_df: Optional[pd.DataFrame] = None,
+            filters: Optional[MovieFilter] = None,
+            ranking: Optional[str] = None
+    ) -> List[Tuple[str, float, int]]:
+        """
+        Return the top-k movies of a popularity ranking ("trending" or "popular", `cold_start_ranking` by default)
+        as (title, score, movie_id), leaving out the movies in `my_ratings` and those rejected by `filters`.
+        No search is made.
+        """
+        if self.popularity is None:
+            raise ValueError("No popularity table, load the ratings or load_ingest_state first")
+        accept = None
+        if filters is not None:
+            self.get_movie_index(movies_df)
+            accept = lambda movie_ids: self.catalog.matches(filters, movie_ids)
+        ranking = ranking or self.cold_start_ranking
+        top_movies = self.popularity.top(top_k, ranking, exclude=my_ratings or {}, accept=accept)
+        return self.attach_titles(top_movies, movies_df)
+
+    def with_fallback(
+            self,
+            recommendations: List[Tuple[str, float, int]],
+            my_ratings: Dict[int, float],
+            top_k: int,
+            filters: Optional[MovieFilter]
+    ) -> List[Tuple[str, float, int]]:
+        """
+        The neighbour recommendations, or the popularity ranking when the neighbours had none.
+        """
+        if recommendations or self.popularity is None:
+            return recommendations
+        return self.popular_movies(top_k, my_ratings, None, filters)
+
+    def needs_vectors(self, scoring: str) -> bool:
         """
-        results = self.client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=NamedSparseVector(name="ratings", vector=self.to_sparse_vector(my_ratings)),
-            limit=20
+        Whether searches must return the neighbours' vectors: for their ratings, or for the movie
+        ids when the backend does not keep them as payload.
+        """
+        return scoring == "rating" or not self.backend.movie_id_payload
+
+    def cache_key(self, my_ratings: Dict[int, float], top_k: int, options: RecommendOptions) -> str:
+        """
+        Result cache key of one `recommend` call.
+        """
+        return profile_key(my_ratings, top_k=top_k, **options._asdict())
+
+    def search_arguments(self, options: RecommendOptions) -> Dict:
+        """
+        Keyword arguments of the backend `search` and `search_batch` calls for `options`.
+        """
+        return dict(
+            limit=options.neighbours,
+            score_threshold=options.min_similarity,
+            with_vectors=self.needs_vectors(options.scoring),
+            query_filter=options.filters
         )
 
-        movie_scores = self.get_unique_movie_scores(my_ratings, results)
-        top_movies = sorted(movie_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+    def answer_without_search(
+            self,
+            users_ratings: Dict[Hashable, Dict[int, float]],
+            movies_df: pd.DataFrame,
+            top_k: int,
+            options: RecommendOptions
+    ) -> Tuple[Dict[Hashable, List[Tuple[str, float, int]]], Dict[Hashable, str]]:
+        """
+        Answer the cold-start profiles from the popularity table and the cached ones from the cache.
 
-        recommendations: List[Tuple[str, float, int]] = []
-        for movie_id, score in top_movies:
-            movie_row = movies_df[movies_df["movieId"] == str(movie_id)]
-            if not movie_row.empty:
-                recommendations.append((movie_row["title"].iloc[0], score, movie_id))
+        Returns these recommendations and the cache key of every profile left for the neighbour search.
+        """
+        if options.filters is not None:
+            self.get_movie_index(movies_df)
+        recommendations: Dict[Hashable, List[Tuple[str, float, int]]] = {}
+        cache_keys: Dict[Hashable, str] = {}
+        for key, profile in users_ratings.items():
+            if self.is_cold_start(profile):
+                recommendations[key] = self.popular_movies(top_k, profile, movies_df, options.filters)
+                continue
+            cache_key = self.cache_key(profile, top_k, options)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                recommendations[key] = cached
+            else:
+                cache_keys[key] = cache_key
+        return recommendations, cache_keys
 
+    def recommend_from_results(
+            self,
+            results: List[List[models.ScoredPoint]],
+            keys: List[Hashable],
+            users_ratings: Dict[Hashable, Dict[int, float]],
+            movies_df: pd.DataFrame,
+            top_k: int,
+            options: RecommendOptions,
+            cache_keys: Dict[Hashable, str]
+    ) -> Dict[Hashable, List[Tuple[str, float, int]]]:
+        """
+        Score the neighbours found for the profiles of `keys`, one result list per key, and cache the recommendations.
+        """
+        profiles = [users_ratings[key] for key in keys]
+        top_movies = self.select_top_movies(
+            results, profiles, top_k, options.weighting, options.scoring, options.filters
+        )
+        recommendations = {}
+        for key, profile, movies in zip(keys, profiles, top_movies):
+            movies = self.attach_titles(movies, movies_df)
+            recommendations[key] = self.with_fallback(movies, profile, top_k, options.filters)
+            self.cache.put(cache_keys[key], recommendations[key])
         return recommendations
+
+    @staticmethod
+    def search_batches(keys: List[Hashable]) -> List[List[Hashable]]:
+        """
+        Split `keys` into the batches of BATCH_SIZE profiles searched together.
+        """
+        return [keys[start:start + BATCH_SIZE] for start in range(0, len(keys), BATCH_SIZE)]
+
+    def build_item_index(
+            self,
+            sparse_vectors: SparseVectors,
+            index_dir: str = ITEM_INDEX_DIR,
+            n_neighbours: int = ITEM_NEIGHBOURS,
+            workers: Optional[int] = None
+    ) -> None:
+        """
+        Precompute the most similar movies of every movie from the user vectors and save them to `index_dir`.
+        """
+        save_item_index(build_item_index(sparse_vectors, n_neighbours, workers=workers), index_dir)
+        self.load_item_index(index_dir)
+
+    def load_item_index(self, index_dir: str = ITEM_INDEX_DIR) -> None:
+        """
+        Memory-map the item index written by `build_item_index`.
+        """
+        self.item_index = load_item_index(index_dir)
+
+    def similar_movies(self, movie_id: int, k: int) -> List[Tuple[str, float, int]]:
+        """
+        Return the k movies most similar to `movie_id` as (title, cosine similarity, movie_id).
+        """
+        if self.item_index is None:
+            raise ValueError("No item index, call build_item_index or load_item_index first")
+        return self.attach_titles(self.item_index.similar(movie_id, k), None)
+
+    def get_movie_index(self, movies_df: pd.DataFrame) -> Dict[int, MovieInfo]:
+        """
+        Return the movie index, building it from `movies_df` on first use.
+        """
+        if self.movie_index is None:
+            self.index_movies(movies_df)
+        return self.movie_index
+
+    def attach_titles(
+            self,
+            top_movies: List[Tuple[int, float]],
+            movies_df: pd.DataFrame
+    ) -> List[Tuple[str, float, int]]:
+        """
+        Turn (movie_id, score) pairs into (title, score, movie_id), skipping unknown movies.
+        """
+        movie_index = self.get_movie_index(movies_df)
+        return [
+            (movie_index[movie_id].title, score, movie_id)
+            for movie_id, score in top_movies
+            if movie_id in movie_index
+        ]
+
+    def neighbour_scores(
+            self,
+            results: List[List[models.ScoredPoint]],
+            weighting: str = "linear",
+            scoring: str = "presence",
+            filters: Optional[MovieFilter] = None
+    ) -> Tuple[np.ndarray, csr_matrix, csr_matrix]:
+        """
+        Aggregate neighbour similarities for a batch of searches as sparse matrix products.
+
+        Returns the candidate movie ids, the score of every (query, movie) pair and a matrix
+        marking which movies at least one neighbour of the query has rated. Rating scoring reads
+        each neighbour's ratings from its "ratings" vector, so the search must return vectors,
+        as it must for presence scoring when the backend keeps no `movie_id` payload.
+        With `filters`, the neighbours' movies that do not pass it are dropped before scoring.
+        """
+        query_rows, scores, movie_ids, ratings, offsets = [], [], [], [], [0]
+        for query_row, points in enumerate(results):
+            for point in points:
+                if scoring == "rating" or "movie_id" not in point.payload:
+                    point_movie_ids = point.vector["ratings"].indices
+                else:
+                    point_movie_ids = point.payload["movie_id"]
+                if scoring == "rating":
+                    point_ratings = point.vector["ratings"].values
+                else:
+                    point_ratings = np.ones(len(point_movie_ids))
+                query_rows.append(query_row)
+                scores.append(point.score)
+                movie_ids.append(np.asarray(point_movie_ids, dtype=np.int64))
+                ratings.append(np.asarray(point_ratings, dtype=np.float64))
+                offsets.append(offsets[-1] + len(point_movie_ids))
+
+        all_movie_ids = np.concatenate([np.empty(0, dtype=np.int64), *movie_ids])
+        all_ratings = np.concatenate([np.empty(0), *ratings])
+        offsets = np.asarray(offsets)
+        if filters is not None:
+            keep = self.catalog.matches(filters, all_movie_ids)
+            all_movie_ids, all_ratings = all_movie_ids[keep], all_ratings[keep]
+            offsets = np.concatenate([[0], np.cumsum(keep)])[offsets]
+        candidates, columns = np.unique(all_movie_ids, return_inverse=True)
+        neighbour_movies = csr_matrix((all_ratings, columns, offsets), shape=(len(scores), len(candidates)))
+        neighbour_rows = np.arange(len(scores))
+        weights = csr_matrix(
+            (NEIGHBOUR_WEIGHTINGS[weighting](np.asarray(scores, dtype=np.float64)), (query_rows, neighbour_rows)),
+            shape=(len(results), len(scores))
+        )
+        touched = csr_matrix((np.ones(len(scores)), (query_rows, neighbour_rows)), shape=weights.shape)
+        neighbour_rated = csr_matrix(
+            (np.ones(len(columns)), columns, offsets),
+            shape=neighbour_movies.shape
+        )
+
+        return candidates, weights @ neighbour_movies, touched @ neighbour_rated
+
+    def select_top_movies(
+            self,
+            results: List[List[models.ScoredPoint]],
+            profiles: List[Dict[int, float]],
+            top_k: int,
+            weighting: str = "linear",
+            scoring: str = "presence",
+            filters: Optional[MovieFilter] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Score the neighbours' movies for each profile and keep the top-k (movie_id, score) pairs
+        of the movies the profile has not rated and that pass `filters`, using partial selection.
+        """
+        candidates, scores, touched = self.neighbour_scores(results, weighting, scoring, filters)
+        scores = scores.toarray()
+        scores[touched.toarray() == 0] = -np.inf
+
+        # Exclude the movies each profile has already rated.
+        rated_rows, rated_columns = [], []
+        for row, profile in enumerate(profiles):
+            rated = np.fromiter(profile.keys(), dtype=np.int64, count=len(profile))
+            columns = np.searchsorted(candidates, rated)
+            known = columns < len(candidates)
+            columns = columns[known][candidates[columns[known]] == rated[known]]
+            rated_rows.append(np.full(len(columns), row))
+            rated_columns.append(columns)
+        if rated_rows:
+            scores[np.concatenate(rated_rows), np.concatenate(rated_columns)] = -np.inf
+
+        k = min(top_k, len(candidates))
+        if k == 0:
+            return [[] for _ in profiles]
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        return [
+            [
+                (int(candidates[column]), float(score))
+                for column, score in zip(best[row], best_scores[row])
+                if np.isfinite(score)
+            ]
+            for row in range(len(profiles))
+        ]
+
+    def recommend_batch(
+            self,
+            users_ratings: Dict[Hashable, Dict[int, float]],
+            movies_df: pd.DataFrame,
+            top_k: int,
+            neighbours: int = NEIGHBOURS_LIMIT,
+            min_similarity: Optional[float] = None,
+            weighting: str = "linear",
+            scoring: str = "presence",
+            filters: Optional[MovieFilter] = None
+    ) -> Dict[Hashable, List[Tuple[str, float, int]]]:
+        """
+        Generate top-k recommendations for many rating profiles, keyed like `users_ratings`.
+
+        Profiles are searched in batches of BATCH_SIZE and scored with the same rules as `recommend`,
+        sharing its cache: only profiles without a cached result and above the cold-start threshold are searched.
+        """
+        options = RecommendOptions(neighbours, min_similarity, weighting, scoring, filters)
+        recommendations, cache_keys = self.answer_without_search(users_ratings, movies_df, top_k, options)
+        for keys in self.search_batches(list(cache_keys)):
+            results = self.backend.search_batch(
+                [self.to_sparse_vector(users_ratings[key]) for key in keys], **self.search_arguments(options)
+            )
+            recommendations.update(
+                self.recommend_from_results(results, keys, users_ratings, movies_df, top_k, options, cache_keys)
+            )
+
+        return {key: recommendations[key] for key in users_ratings}
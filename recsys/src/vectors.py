@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from typing import Iterator, Sequence, Tuple
+
+import numpy as np
+
+# Bytes per rating value for each storage type of Qdrant sparse vectors.
+VALUE_DTYPES = {"float32": 4, "float16": 2, "uint8": 1}
+
+
+@dataclass
+class SparseVectors:
+    """
+    Per-user sparse rating vectors stored in CSR layout.
+
+    The indices and values of user ``user_ids[i]`` are
+    ``indices[offsets[i]:offsets[i + 1]]`` and ``values[offsets[i]:offsets[i + 1]]``.
+    """
+    user_ids: np.ndarray
+    offsets: np.ndarray
+    indices: np.ndarray
+    values: np.ndarray
+
+    @classmethod
+    def from_rows(cls, user_ids: Sequence[int], indices: Sequence, values: Sequence) -> "SparseVectors":
+        """
+        Build the CSR layout from one (indices, values) pair per user.
+        """
+        counts = np.fromiter((len(row) for row in indices), dtype=np.int64, count=len(indices))
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(
+            user_ids=np.asarray(user_ids, dtype=np.int64),
+            offsets=offsets,
+            indices=np.concatenate([np.empty(0, dtype=np.int64), *indices]).astype(np.int64),
+            values=np.concatenate([np.empty(0), *values]).astype(np.float64)
+        )
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def items(self) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Yield (user_id, indices, values) for each user, the arrays are views into the CSR buffers.
+        """
+        for i, user_id in enumerate(self.user_ids.tolist()):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            yield user_id, self.indices[start:end], self.values[start:end]
+
+    def quantized(self, value_dtype: str) -> "SparseVectors":
+        """
+        The same vectors with values rounded as they would be stored as `value_dtype`, returned as floats.
+
+        float16 rounds each value to half precision; uint8 maps each user's values linearly onto
+        256 levels between that user's lowest and highest rating.
+        """
+        if value_dtype not in VALUE_DTYPES:
+            raise ValueError(f"Unknown value type {value_dtype!r}, expected one of {sorted(VALUE_DTYPES)}")
+        values = self.values.astype(np.float32)
+        if value_dtype == "float16":
+            values = values.astype(np.float16).astype(np.float32)
+        elif value_dtype == "uint8" and len(values):
+            counts = np.diff(self.offsets)
+            starts = self.offsets[:-1][counts > 0]
+            low = np.repeat(np.minimum.reduceat(values, starts), counts[counts > 0])
+            high = np.repeat(np.maximum.reduceat(values, starts), counts[counts > 0])
+            step = (high - low) / 255
+            codes = np.round(np.divide(values - low, step, out=np.zeros_like(values), where=step > 0))
+            values = low + codes * step
+        return SparseVectors(user_ids=self.user_ids, offsets=self.offsets, indices=self.indices, values=values)
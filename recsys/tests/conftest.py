@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+RECSYS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def recsys_dir(monkeypatch):
+    """
+    Run every test from the project directory, where the data/ paths of src.sparse resolve.
+    """
+    monkeypatch.chdir(RECSYS_DIR)
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from benchmark import sample_profiles
+from loadtest import StandInBackend
+from src.async_recommender import AsyncRecommender
+from src.backends import LocalBackend
+from src.cache import ResultCache
+from src.filters import MovieFilter
+from src.sparse import Recommender
+
+START_YEAR = 2000
+TOP_K = 7
+
+
+@pytest.fixture(scope="module")
+def prepared():
+    loader = Recommender(backend=LocalBackend())
+    movies_df, ratings_df = loader.load_and_filter_data(START_YEAR)
+    agg_ratings_df = loader.prepare_ratings_data(movies_df, ratings_df)
+    return movies_df, ratings_df, agg_ratings_df
+
+
+def build(recommender_class, prepared, **kwargs):
+    movies_df, ratings_df, agg_ratings_df = prepared
+    backend = LocalBackend()
+    if recommender_class is AsyncRecommender:
+        kwargs["async_backend"] = StandInBackend(backend, 0)
+    recommender = recommender_class(backend=backend, **kwargs)
+    recommender.load_and_filter_data(START_YEAR)
+    recommender.prepare_ratings_data(movies_df, ratings_df)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(agg_ratings_df))
+    return recommender
+
+
+@pytest.mark.parametrize("filters", [None, MovieFilter(min_year=2005, genres=("Comedy",))])
+def test_async_matches_sync(prepared, filters):
+    movies_df, _, agg_ratings_df = prepared
+    sync = build(Recommender, prepared, cache=ResultCache(max_entries=0))
+    asynchronous = build(AsyncRecommender, prepared, cache=ResultCache(max_entries=0))
+    profiles = sample_profiles(agg_ratings_df, 20)
+    profiles["cold"] = {1: 1.0}
+
+    async def run():
+        single = {key: await asynchronous.recommend(profile, movies_df, TOP_K, filters=filters)
+                  for key, profile in profiles.items()}
+        return single, await asynchronous.recommend_batch(profiles, movies_df, TOP_K, filters=filters)
+
+    single, batch = asyncio.run(run())
+    assert single == {
+        key: sync.recommend(profile, movies_df, TOP_K, filters=filters) for key, profile in profiles.items()
+    }
+    assert batch == sync.recommend_batch(profiles, movies_df, TOP_K, filters=filters)
+
+
+def test_repeated_profiles_are_served_from_the_cache(prepared):
+    movies_df, _, agg_ratings_df = prepared
+    recommender = build(Recommender, prepared)
+    profiles = sample_profiles(agg_ratings_df, 5)
+
+    first = recommender.recommend_batch(profiles, movies_df, TOP_K)
+    assert recommender.cache.stats().misses == len(profiles)
+    assert recommender.recommend_batch(profiles, movies_df, TOP_K) == first
+    assert recommender.cache.stats().hits == len(profiles)
+
+
+def test_cold_start_options_are_passed_through():
+    recommender = AsyncRecommender(
+        backend=LocalBackend(), async_backend=StandInBackend(LocalBackend(), 0),
+        cold_start_threshold=5, cold_start_ranking="popular"
+    )
+    assert (recommender.cold_start_threshold, recommender.cold_start_ranking) == (5, "popular")
@@ -0,0 +1,16 @@
+import numpy as np
+
+from src.factors import BLOCK_BYTES, BLOCK_NNZ, FactorRecommender
+
+
+def test_row_groups_cap_padded_ratings_and_normal_equations():
+    recommender = FactorRecommender(factors=64)
+    # Mostly single-rating rows, the shape of a movie side dominated by rarely rated movies.
+    counts = np.concatenate([np.ones(20000, dtype=np.int64), np.arange(1, 500)])
+
+    groups = recommender.row_groups(counts)
+
+    assert np.array_equal(np.sort(np.concatenate(groups)), np.arange(len(counts)))
+    for rows in groups:
+        assert len(rows) * counts[rows].max() <= BLOCK_NNZ or len(rows) == 1
+        assert len(rows) * recommender.factors ** 2 * 8 <= BLOCK_BYTES
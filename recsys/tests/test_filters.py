@@ -0,0 +1,35 @@
+from src.backends import LocalBackend
+from src.filters import MovieFilter
+from src.sparse import RecommendOptions, Recommender
+
+START_YEAR = 2000
+
+
+def test_filters_are_hashable_with_list_genres():
+    movie_filter = MovieFilter(min_year=2005, genres=["Comedy", "Drama"], exclude=[1, 2])
+
+    assert movie_filter == MovieFilter(min_year=2005, genres=("Comedy", "Drama"), exclude=(1, 2))
+    assert {movie_filter: True}[MovieFilter(min_year=2005, genres=("Comedy", "Drama"), exclude=(1, 2))]
+
+
+def test_filtered_recommendations_only_score_matching_movies():
+    recommender = Recommender(backend=LocalBackend())
+    movies_df, ratings_df = recommender.load_and_filter_data(START_YEAR)
+    agg_ratings_df = recommender.prepare_ratings_data(movies_df, ratings_df)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(agg_ratings_df))
+    profile = {4306: 1.0, 6539: 1.0, 5952: 1.0, 2571: -1.0}
+    movie_filter = MovieFilter(min_year=2005, max_year=2010, genres=["Comedy"], exclude=[8961])
+
+    recommendations = recommender.recommend(profile, movies_df, 10, filters=movie_filter)
+    results = recommender.backend.search(
+        recommender.to_sparse_vector(profile), **recommender.search_arguments(RecommendOptions(filters=movie_filter))
+    )
+    candidates, _, _ = recommender.neighbour_scores([results], filters=movie_filter)
+
+    assert len(recommendations) == 10
+    assert recommender.catalog.matches(movie_filter, candidates).all()
+    for _, _, movie_id in recommendations:
+        info = recommender.movie_index[movie_id]
+        assert 2005 <= info.year <= 2010 and "Comedy" in info.genres.split("|") and movie_id != 8961
+
@@ -0,0 +1,40 @@
+import pandas as pd
+from qdrant_client import QdrantClient
+
+from src.backends import LocalBackend, QdrantBackend
+from src.sparse import Recommender
+
+START_YEAR = 2000
+
+
+def test_streaming_ingest_creates_the_collection():
+    recommender = Recommender(backend=QdrantBackend(QdrantClient(":memory:")))
+    recommender.ingest_streaming(START_YEAR, chunk_size=20_000)
+
+    _, ratings_df = Recommender(backend=LocalBackend()).load_and_filter_data(START_YEAR)
+    assert recommender.backend.client.count(recommender.backend.collection_name).count == ratings_df["userId"].nunique()
+
+
+def test_update_ratings_counts_only_new_pairs_in_popularity():
+    recommender = Recommender(backend=LocalBackend())
+    movies_df, ratings_df = recommender.load_and_filter_data(START_YEAR)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(
+        recommender.prepare_ratings_data(movies_df, ratings_df.copy())
+    ))
+    user_id, rated = int(ratings_df["userId"].iloc[0]), int(ratings_df["movieId"].iloc[0])
+    unrated = int(movies_df.loc[~movies_df["movieId"].isin(ratings_df["movieId"]), "movieId"].iloc[0])
+    counts = dict(zip(recommender.popularity.movie_ids.tolist(), recommender.popularity.counts.tolist()))
+
+    timestamp = recommender.watermark + 1
+    updated = recommender.update_ratings(pd.DataFrame({
+        "userId": [user_id, user_id, user_id],
+        "movieId": [rated, unrated, unrated],
+        "rating": [1.0, 4.0, 5.0],
+        "timestamp": [timestamp, timestamp, timestamp + 1]
+    }))
+
+    popularity = dict(zip(recommender.popularity.movie_ids.tolist(), recommender.popularity.counts.tolist()))
+    assert updated == 1
+    assert popularity[rated] == counts[rated]
+    assert popularity[unrated] == 1
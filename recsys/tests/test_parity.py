@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from benchmark import TOP_K, same_recommendations, sample_profiles
+from src.backends import LocalBackend, QdrantBackend
+from src.cache import ResultCache
+from src.sparse import NEIGHBOURS_LIMIT, Recommender
+
+START_YEAR = 2000
+USERS = 50
+
+
+@pytest.fixture(scope="module")
+def engines():
+    """
+    The same data/ratings.csv vectors uploaded to an in-memory Qdrant client and to the local backend.
+    """
+    no_cache = ResultCache(max_entries=0)
+    qdrant = Recommender(backend=QdrantBackend(QdrantClient(":memory:")), cache=no_cache)
+    local = Recommender(backend=LocalBackend(), cache=no_cache)
+    movies_df, ratings_df = local.load_and_filter_data(START_YEAR)
+    agg_ratings_df = local.prepare_ratings_data(movies_df, ratings_df)
+    sparse_vectors = local.convert_to_sparse_vectors(agg_ratings_df)
+    for engine in (qdrant, local):
+        engine.index_movies(movies_df)
+        engine.setup_collection(delete_existing=True)
+        engine.upload_data(sparse_vectors)
+    return qdrant, local, movies_df, agg_ratings_df
+
+
+def untied_profiles(local: Recommender, agg_ratings_df):
+    """
+    Sampled profiles whose neighbour cut-off is not a tie, where either engine may keep either user.
+    """
+    profiles = sample_profiles(agg_ratings_df, USERS)
+    for user_id, profile in profiles.items():
+        neighbours = local.backend.search(local.to_sparse_vector(profile), limit=NEIGHBOURS_LIMIT + 1)
+        if len(neighbours) <= NEIGHBOURS_LIMIT or not np.isclose(neighbours[-1].score, neighbours[-2].score):
+            yield user_id, profile
+
+
+def test_local_backend_matches_qdrant(engines):
+    qdrant, local, movies_df, agg_ratings_df = engines
+    compared = 0
+    for user_id, profile in untied_profiles(local, agg_ratings_df):
+        expected = qdrant.recommend(profile, movies_df, TOP_K)
+        actual = local.recommend(profile, movies_df, TOP_K)
+        assert same_recommendations(expected, actual), f"user {user_id}: qdrant={expected} local={actual}"
+        compared += 1
+    assert compared > USERS // 2
+
+
+def test_local_batch_matches_qdrant(engines):
+    qdrant, local, movies_df, agg_ratings_df = engines
+    profiles = dict(untied_profiles(local, agg_ratings_df))
+    expected = qdrant.recommend_batch(profiles, movies_df, TOP_K)
+    actual = local.recommend_batch(profiles, movies_df, TOP_K)
+    for user_id in profiles:
+        assert same_recommendations(expected[user_id], actual[user_id]), f"user {user_id}"
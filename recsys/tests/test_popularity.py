@@ -0,0 +1,40 @@
+import pandas as pd
+
+from src.backends import LocalBackend
+from src.popularity import PopularityTable
+from src.sparse import Recommender
+
+DAY = 86400
+
+
+def ratings(*rows):
+    return pd.DataFrame(rows, columns=["userId", "movieId", "rating", "timestamp"])
+
+
+def test_top_ranks_by_count_and_recency():
+    table = PopularityTable.from_ratings(ratings(
+        (1, 10, 4.0, 0), (2, 10, 4.0, 0), (3, 10, 4.0, 0), (1, 20, 4.0, 400 * DAY), (2, 20, 4.0, 400 * DAY)
+    ))
+
+    assert [movie_id for movie_id, _ in table.top(2, "popular")] == [10, 20]
+    assert [movie_id for movie_id, _ in table.top(2, "trending")] == [20, 10]
+    assert table.top(5, "popular", exclude={10}) == [(20, 2.0)]
+
+
+def test_top_of_zero_movies_is_empty():
+    table = PopularityTable.from_ratings(ratings((1, 10, 4.0, 0), (1, 20, 4.0, 0)))
+
+    assert table.top(0) == []
+    assert table.top(-1, "popular") == []
+
+
+def test_recommend_top_zero_returns_no_movies():
+    recommender = Recommender(backend=LocalBackend())
+    movies_df, ratings_df = recommender.load_and_filter_data(2000)
+    agg_ratings_df = recommender.prepare_ratings_data(movies_df, ratings_df)
+    recommender.setup_collection(delete_existing=True)
+    recommender.upload_data(recommender.convert_to_sparse_vectors(agg_ratings_df))
+    profile = dict(zip(agg_ratings_df["movieId"].astype(int)[:5], agg_ratings_df["rating"][:5]))
+
+    assert recommender.recommend(profile, movies_df, 0) == []
+    assert recommender.recommend({}, movies_df, 0) == []
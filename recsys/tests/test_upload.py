@@ -0,0 +1,64 @@
+import threading
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from src.backends import LocalBackend, QdrantBackend
+from src.vectors import SparseVectors
+
+
+class BrokenPointsBackend(QdrantBackend):
+
+    def generate_points(self, sparse_vectors):
+        yield from super().generate_points(sparse_vectors)
+        raise RuntimeError("bad point")
+
+
+def sparse_vectors(n_users: int) -> SparseVectors:
+    return SparseVectors(
+        user_ids=np.arange(n_users, dtype=np.int64),
+        offsets=np.arange(n_users + 1, dtype=np.int64) * 2,
+        indices=np.tile(np.array([1, 2], dtype=np.int64), n_users),
+        values=np.ones(2 * n_users)
+    )
+
+
+def test_upload_raises_the_producer_error():
+    backend = BrokenPointsBackend(QdrantClient(":memory:"), batch_size=4, parallel=2)
+    backend.setup(delete_existing=True)
+    errors = []
+
+    def upload() -> None:
+        try:
+            backend.upload(sparse_vectors(10))
+        except Exception as error:
+            errors.append(error)
+
+    # A daemon thread, so a hanging upload fails the test instead of blocking the run.
+    thread = threading.Thread(target=upload, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "upload hung after the producer failed"
+    assert [str(error) for error in errors] == ["bad point"]
+
+
+def test_upload_stores_every_user():
+    backend = QdrantBackend(QdrantClient(":memory:"), batch_size=4, parallel=2)
+    backend.setup(delete_existing=True)
+    report = backend.upload(sparse_vectors(10))
+    assert report.points == 10
+    assert backend.client.count(backend.collection_name).count == 10
+
+
+def test_local_chunked_uploads_replace_earlier_rows_in_upload_order():
+    backend = LocalBackend()
+    backend.setup()
+    backend.upload(SparseVectors.from_rows([1, 2, 3], [[0], [1], [2]], [[1.0], [1.0], [1.0]]))
+    backend.upload(SparseVectors.from_rows([2, 4], [[5], [0, 5]], [[2.0], [3.0, 1.0]]))
+    backend.upload(SparseVectors.from_rows([1], [[7]], [[4.0]]))
+
+    stored = backend.retrieve([1, 2, 3, 4])
+    assert stored.user_ids.tolist() == [3, 2, 4, 1]
+    assert stored.indices.tolist() == [2, 5, 0, 5, 7]
+    assert stored.values.tolist() == [1.0, 2.0, 3.0, 1.0, 4.0]
+    assert backend.matrix.shape == (4, 8)